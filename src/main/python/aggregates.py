@@ -0,0 +1,169 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from column_store import ColumnStore
+
+_logger = logging.getLogger(__name__)
+
+
+def _sample_stats(x, columns: Dict[str, np.ndarray]):
+    """Statistics of individual samples, ready to be combined into buckets"""
+    stats = {"t.n": np.ones(len(x)), "t.sum": np.asarray(x, dtype=float)}
+    for k, y in columns.items():
+        y = np.asarray(y, dtype=float)
+        isnan = np.isnan(y)
+        stats[k + ".n"] = (~isnan).astype(float)
+        stats[k + ".sum"] = np.where(isnan, 0.0, y)
+        stats[k + ".min"] = y
+        stats[k + ".max"] = y
+    return stats
+
+
+def _combine(b, stats: Dict[str, np.ndarray]):
+    """Combine statistics which fall into the same bucket ('b')"""
+    if np.any(b[1:] < b[:-1]):
+        order = np.argsort(b, kind="stable")
+        b = b[order]
+        stats = {k: v[order] for k, v in stats.items()}
+    starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+    ret = {"b": b[starts]}
+    for k, v in stats.items():
+        if k.endswith(".min"):
+            ret[k] = np.fmin.reduceat(v, starts)
+        elif k.endswith(".max"):
+            ret[k] = np.fmax.reduceat(v, starts)
+        else:
+            ret[k] = np.add.reduceat(v, starts)
+    return ret
+
+
+class AggregatePyramid(object):
+    """Mean, min, max and count of some columns, per label, at several resolutions
+
+    Each level holds one row per time bucket ('widths', in seconds) for
+    each label (e.g. detector).  New samples are reduced into buckets
+    and combined with the last bucket of each level, so keeping the
+    pyramid up to date costs about the same as the new data.  Coarse
+    levels are small, so they can span much longer than the raw data
+    which is kept for plotting (up to 'max_age' seconds).
+
+    Samples which fall inside the span of time already added for a label
+    are ignored, so the same rows can be offered more than once.
+    """
+
+    def __init__(
+        self,
+        ycols: List[str],
+        widths: Sequence[float] = (30 * 60, 6 * 3600, 24 * 3600),
+        max_age: float = 400 * 24 * 3600,
+    ):
+        self.ycols = ycols
+        self.widths = list(widths)
+        self.max_age = max_age
+        self._levels: Dict[Optional[str], List[ColumnStore]] = {}
+        # span of time added so far, for each label
+        self._coverage: Dict[Optional[str], Tuple[float, float]] = {}
+
+    def clear(self):
+        self._levels.clear()
+        self._coverage.clear()
+
+    @property
+    def labels(self) -> List[Optional[str]]:
+        return list(self._levels)
+
+    def coverage(self, label) -> Optional[Tuple[float, float]]:
+        return self._coverage.get(label)
+
+    def add(self, label, x, columns: Dict[str, np.ndarray]):
+        """Add samples, times 'x' (increasing) and one array per column"""
+        if len(x) == 0:
+            return
+        span = self._coverage.get(label)
+        if span is not None:
+            keep = (x < span[0]) | (x > span[1])
+            if not np.all(keep):
+                x = x[keep]
+                columns = {k: v[keep] for k, v in columns.items()}
+            if len(x) == 0:
+                return
+            span = (min(span[0], x[0]), max(span[1], x[-1]))
+        else:
+            span = (x[0], x[-1])
+        self._coverage[label] = span
+        columns = {k: columns.get(k, np.full(len(x), np.nan)) for k in self.ycols}
+        stats = _sample_stats(x, columns)
+        levels = self._levels.setdefault(label, [ColumnStore() for _ in self.widths])
+        for store, width in zip(levels, self.widths):
+            self._add_to_level(store, _combine(np.floor(x / width), stats))
+            self._expire(store, span[1], width)
+
+    def merge(self, other: "AggregatePyramid"):
+        """Add everything from another pyramid, with the same columns and levels
+
+        The two are assumed to cover different spans of time (e.g. 'other'
+        was built from older rows in a background thread).
+        """
+        for label, other_levels in other._levels.items():
+            other_span = other._coverage[label]
+            span = self._coverage.get(label, other_span)
+            span = (min(span[0], other_span[0]), max(span[1], other_span[1]))
+            self._coverage[label] = span
+            levels = self._levels.setdefault(
+                label, [ColumnStore() for _ in self.widths]
+            )
+            for store, other_store, width in zip(levels, other_levels, self.widths):
+                if len(other_store) > 0:
+                    new = {k: other_store.column(k) for k in other_store.column_names}
+                    self._add_to_level(store, new)
+                    self._expire(store, span[1], width)
+
+    def _add_to_level(self, store: ColumnStore, new: Dict[str, np.ndarray]):
+        if len(store) > 0:
+            b_last = store.column("b")[-1]
+            if new["b"][0] == b_last:
+                # the first new bucket continues the last stored one
+                old = {k: store.column(k)[-1:] for k in store.column_names}
+                store.remove_last(1)
+                new = _combine(
+                    np.r_[b_last, new["b"]],
+                    {k: np.r_[old[k], new[k]] for k in new if k != "b"},
+                )
+            elif new["b"][0] < b_last:
+                # older data, so rebuild the level (this is rare)
+                old = {k: store.column(k) for k in store.column_names}
+                store.clear()
+                new = _combine(
+                    np.r_[old["b"], new["b"]],
+                    {k: np.r_[old[k], new[k]] for k in new if k != "b"},
+                )
+        store.extend_columns(new)
+
+    def _expire(self, store: ColumnStore, t_newest, width):
+        if len(store) > 0:
+            cutoff = np.floor((t_newest - self.max_age) / width)
+            store.remove_first(np.searchsorted(store.column("b"), cutoff))
+
+    def choose_level(self, pixel_width) -> int:
+        """The coarsest level with at least one bucket per pixel
+
+        Returns -1 if the finest level is coarser than a pixel.
+        """
+        level = -1
+        for ii, width in enumerate(self.widths):
+            if width <= pixel_width:
+                level = ii
+        return level
+
+    def level_data(self, label, level: int, ycol: str):
+        """Time (mean of each bucket), mean, min, max and count of 'ycol'"""
+        store = self._levels[label][level]
+        if len(store) == 0:
+            empty = np.empty(0)
+            return empty, empty, empty, empty, empty
+        n = store.column(ycol + ".n")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = store.column("t.sum") / store.column("t.n")
+            mean = store.column(ycol + ".sum") / n
+        return t, mean, store.column(ycol + ".min"), store.column(ycol + ".max"), n
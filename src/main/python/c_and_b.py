@@ -26,6 +26,8 @@ class CAndBForm(QtWidgets.QWidget, Ui_CAndBForm):
         self.setupUi(self)
         self.mainwindow = mainwindow
         self.schedule_pending = False
+        # time.monotonic() when the schedule was last re-sent
+        self._schedule_resent_time = -math.inf
         self._controls_to_disable_in_scheduled_mode = [
             self.operationTypeComboBox,
             self.startLaterCheckBox,
@@ -120,11 +122,15 @@ class CAndBForm(QtWidgets.QWidget, Ui_CAndBForm):
             self.on_cal_interval_changed
         )
 
-        # TODO: consider using a single timer in mainwindow
-        self.redraw_timer = QtCore.QTimer()
-        self.redraw_timer.setInterval(1000)
-        self.redraw_timer.timeout.connect(self.update_displays)
-        self.redraw_timer.start()
+        # this runs even when the dialog is hidden, because it also takes care
+        # of re-engaging the cal/bg schedule
+        scheduler = self.mainwindow.scheduler
+        task = scheduler.register(
+            "CAndBForm.update_displays", self.update_displays, interval=1.0
+        )
+        self.destroyed.connect(lambda: scheduler.unregister(task))
+        # cal/bg state comes from the shared status snapshot
+        self.mainwindow.status_service.cal_bg_changed.connect(self.on_cal_bg_changed)
 
     def on_cal_interval_changed(self, s):
         """Keep the background interval set to a constant multiple of the cal interval"""
@@ -260,12 +266,15 @@ class CAndBForm(QtWidgets.QWidget, Ui_CAndBForm):
         self.scheduleEngagedLabel.setText(msg)
         self.enableScheduleButton.setText(button_msg)
         self.save_state_to_qsettings()
+        self.mainwindow.status_service.invalidate()
 
     def schedule_engaged(self):
         return self.enableScheduleButton.isChecked()
 
     def update_main_display(self):
         """tells the main Gui to update"""
+        # the cached status is out of date after a command
+        self.mainwindow.status_service.invalidate()
         # TODO: there might be a simpler way to do this,
         #  'schedule next event loop' or similar
         t = QtCore.QTimer(self)
@@ -282,20 +291,6 @@ class CAndBForm(QtWidgets.QWidget, Ui_CAndBForm):
         )
         self.calbgDateTimeEdit.setMinimumDateTime(next30min)
 
-        # A period check that a cal or bg is running, if the start button is checked
-        if self.startStopPushButton.isChecked():
-            ic = self.mainwindow.instrument_controller
-            reset_onceoff_controls = (ic is None) or (
-                not ic.cal_running and not ic.bg_running
-            )
-            if reset_onceoff_controls:
-                self.startStopPushButton.setChecked(False)
-                for itm in self._controls_to_disable_during_onceoff:
-                    itm.setEnabled(True)
-                # special case - enabled only if option box is checked
-                self.calbgDateTimeEdit.setEnabled(self.startLaterCheckBox.isChecked())
-                self.startStopPushButton.setText("Start")
-
         # A periodic check that the
         # schedule is correctly engaged, if the button has been
         # engaged.
@@ -303,17 +298,48 @@ class CAndBForm(QtWidgets.QWidget, Ui_CAndBForm):
         # --- but the instrument controller was not ready
         if self.schedule_pending:
             self.on_enable_schedule_clicked(True)
+        # in case re-sending the schedule didn't work
+        self.check_schedule_engaged(self.mainwindow.status_service.snapshot)
+
+    def check_schedule_engaged(self, snapshot):
+        """Re-send the schedule if the instrument controller doesn't have it
+
+        This is only done once per status snapshot, since the snapshot is
+        out of date as soon as the schedule has been sent.
+        """
         # --- this is the situation where the instrument controller
         # --- was stopped and restarted, and the schedule needs to be
         # --- retransmitted after the restart
-        ic = self.mainwindow.instrument_controller
         if (
             self.schedule_engaged()
-            and ic is not None
-            and not ic.cal_and_bg_is_scheduled()
+            and snapshot is not None
+            and not snapshot.cal_and_bg_scheduled
+            and snapshot.time > self._schedule_resent_time
         ):
+            self._schedule_resent_time = time.monotonic()
             self.on_enable_schedule_clicked(True)
 
+    def on_cal_bg_changed(self, snapshot):
+        """Sync the controls with the cal/bg state of the instrument controller
+
+        'snapshot' is a StatusSnapshot, or None if there is no instrument
+        controller.
+        """
+        # Check that a cal or bg is running, if the start button is checked
+        if self.startStopPushButton.isChecked():
+            reset_onceoff_controls = (snapshot is None) or (
+                not snapshot.cal_running and not snapshot.bg_running
+            )
+            if reset_onceoff_controls:
+                self.startStopPushButton.setChecked(False)
+                for itm in self._controls_to_disable_during_onceoff:
+                    itm.setEnabled(True)
+                # special case - enabled only if option box is checked
+                self.calbgDateTimeEdit.setEnabled(self.startLaterCheckBox.isChecked())
+                self.startStopPushButton.setText("Start")
+
+        self.check_schedule_engaged(snapshot)
+
     def onCalibrate(self, s=None):
         if self.startLaterCheckBox.isChecked():
             start_time = (
@@ -436,7 +462,3 @@ class CAndBForm(QtWidgets.QWidget, Ui_CAndBForm):
     def hideEvent(self, event):
         self.save_state_to_qsettings()
         super(CAndBForm, self).hideEvent(event)
-
-    def __del__(self):
-        self.redraw_timer.disconnect()
-        self.redraw_timer.deleteLater()
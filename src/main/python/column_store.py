@@ -0,0 +1,493 @@
+import datetime
+import logging
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+
+def _kind_of(value):
+    """Classify a value into the kind of column which can hold it"""
+    # note: bool is a subclass of int, but we want True/False to display
+    # as-is so they're stored as generic python objects
+    if isinstance(value, bool):
+        return object
+    if isinstance(value, (int, np.integer)):
+        return int
+    if isinstance(value, (float, np.floating)):
+        return float
+    return object
+
+
+def _kind_of_dtype(dtype):
+    if dtype.kind == "f":
+        return float
+    if dtype.kind in "iu":
+        return int
+    return object
+
+
+# Rows are kept in time order using this column
+SORT_BY = "Datetime"
+# name of the (hidden) column holding SORT_BY as a float timestamp
+_SORT_KEY = "_sort_key"
+# name of the (hidden) column holding SORT_BY in pyqtgraph's time axis
+_TIME_AXIS = "_time_axis"
+
+_dtype_for_kind = {
+    int: np.dtype(np.int64),
+    float: np.dtype(np.float64),
+    object: np.dtype(object),
+}
+
+
+def estimate_row_nbytes(row: Dict, fixed_capacity=True) -> int:
+    """Approximate memory used by one row like 'row' in a ColumnStore
+
+    Python objects (e.g. datetimes) held in 'object' columns are counted
+    too.  Rows in a fixed-capacity store take up two slots.
+    """
+    slot_nbytes = 0
+    object_nbytes = 0
+    for v in row.values():
+        kind = _kind_of(v)
+        slot_nbytes += _dtype_for_kind[kind].itemsize
+        if kind is object:
+            object_nbytes += sys.getsizeof(v)
+    if isinstance(row.get(SORT_BY), datetime.datetime):
+        # the hidden columns
+        slot_nbytes += _dtype_for_kind[float].itemsize * 2
+    if fixed_capacity:
+        slot_nbytes *= 2
+    return slot_nbytes + object_nbytes
+
+
+class ColumnStore(object):
+    """Rows of a data table, stored as one typed numpy array per column
+
+    Rows arrive as a list of dicts (the format returned by
+    `instrument_controller.get_rows`) and are written into the column
+    arrays once, when they are added.  After that, looking up a value is
+    an array index and a whole column can be handed out as an array view.
+
+    The type of each column is taken from the first row.  If a later value
+    doesn't fit (e.g. a None in an integer column) the column is converted
+    to a generic 'object' array so that nothing is lost.
+
+    If 'capacity' is given, the store is a fixed-size circular buffer:
+    logical row numbers are mapped onto physical slots starting from a
+    moving 'head', so dropping the oldest rows just advances the head and
+    adding rows past capacity overwrites the oldest slots.  Each row is
+    written twice, at slot p and p+capacity, which means the rows in order
+    are always a contiguous slice and columns can still be handed out as
+    views.  Without a capacity, the arrays grow geometrically as needed.
+    """
+
+    def __init__(
+        self,
+        rows: Optional[List[Dict]] = None,
+        capacity: Optional[int] = None,
+        initial_capacity=64,
+    ):
+        self._initial_capacity = initial_capacity
+        self._fixed_capacity = capacity
+        # incremented whenever rows are renumbered (other than by appending
+        # or dropping the oldest rows), see GroupIndex
+        self._generation = 0
+        self._group_indexes: Dict[str, "GroupIndex"] = {}
+        self.clear()
+        if rows:
+            self.extend(rows)
+
+    def clear(self):
+        self._column_names: List[str] = []
+        self._kinds: Dict[str, type] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._capacity = 0
+        # physical index of logical row 0
+        self._head = 0
+        self._n = 0
+        # rows are numbered in order of arrival, this is the number of
+        # logical row 0
+        self._first_seq = 0
+        self._generation += 1
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def column_names(self) -> List[str]:
+        return self._column_names
+
+    @property
+    def first_seq(self) -> int:
+        """Arrival number of the oldest row"""
+        return self._first_seq
+
+    @property
+    def seq_end(self) -> int:
+        """Arrival number of the next row to be appended"""
+        return self._first_seq + self._n
+
+    @property
+    def capacity(self) -> Optional[int]:
+        """Maximum number of rows, or None if the store grows without limit"""
+        return self._fixed_capacity
+
+    def overflow(self, nrows: int) -> int:
+        """How many of the oldest rows need to go to make room for 'nrows' more"""
+        if self._fixed_capacity is None:
+            return 0
+        return max(0, self._n + nrows - self._fixed_capacity)
+
+    def _allocate(self, capacity):
+        """(re-)allocate the column arrays with room for 'capacity' rows
+
+        Existing rows are moved to the start of the new arrays.
+        """
+        nphys = capacity * 2 if self._fixed_capacity is not None else capacity
+        for k in self._kinds:
+            arr = np.empty(nphys, dtype=_dtype_for_kind[self._kinds[k]])
+            old = self._columns.get(k)
+            if old is not None:
+                arr[: self._n] = old[self._head : self._head + self._n]
+            self._columns[k] = arr
+        self._capacity = capacity
+        self._head = 0
+
+    def _reserve(self, nrows):
+        """make sure there's room for 'nrows' more rows, growing geometrically"""
+        if self._fixed_capacity is not None:
+            if self._capacity == 0:
+                self._allocate(self._fixed_capacity)
+            return
+        needed = self._n + nrows
+        if self._head + needed <= self._capacity:
+            return
+        if needed <= self._capacity // 2:
+            # plenty of space once the dropped rows are reclaimed, so
+            # just shift the live rows back to the start
+            for arr in self._columns.values():
+                arr[: self._n] = arr[self._head : self._head + self._n]
+            self._head = 0
+            return
+        capacity = max(self._capacity, self._initial_capacity)
+        while capacity < needed:
+            capacity *= 2
+        self._allocate(capacity)
+
+    def _promote_to_object(self, k):
+        arr = self._columns[k].astype(object)
+        self._columns[k] = arr
+        self._kinds[k] = object
+        _logger.debug(f"Column {k} contains mixed types, storing as objects")
+
+    def _set_columns(self, row):
+        """Take the column names and types from the first row"""
+        self._column_names = list(row)
+        self._kinds = {k: _kind_of(v) for k, v in row.items()}
+        if isinstance(row.get(SORT_BY), datetime.datetime):
+            self._kinds[_SORT_KEY] = float
+            self._kinds[_TIME_AXIS] = float
+
+    def _to_arrays(self, rows) -> Dict[str, np.ndarray]:
+        """Convert rows into one array per column, ready to be written"""
+        arrays = {}
+        for k in self._column_names:
+            values = [row[k] for row in rows]
+            kind = self._kinds[k]
+            if kind is not object and any(_kind_of(v) is not kind for v in values):
+                self._promote_to_object(k)
+            arrays[k] = np.array(values, dtype=self._columns[k].dtype)
+        if _SORT_KEY in self._kinds:
+            # the only per-row conversion of the times, after this they are
+            # handed out as array views
+            key = np.array([row[SORT_BY].timestamp() for row in rows])
+            arrays[_SORT_KEY] = key
+            # pyqtgraph timestamps are assumed to be in non-daylight saving
+            # time, so subtract the timezone offset to get display in UTC
+            arrays[_TIME_AXIS] = key + time.timezone
+        return arrays
+
+    def _write(self, logical_start, arrays: Dict[str, np.ndarray]):
+        """Write arrays into the store, starting from a logical row number"""
+        nrows = len(next(iter(arrays.values())))
+        i0 = self._head + logical_start
+        i1 = i0 + nrows
+        if self._fixed_capacity is None:
+            slots = [slice(i0, i1)]
+        else:
+            # physical slots for the new rows, and their mirror images
+            cap = self._capacity
+            idx = np.arange(i0, i1) % cap
+            slots = [idx, idx + cap]
+        for k, values in arrays.items():
+            arr = self._columns[k]
+            for s in slots:
+                arr[s] = values
+
+    def extend(self, rows: List[Dict]):
+        """Append rows (a list of dicts) to the end of the store
+
+        For a fixed-capacity store, the oldest rows are overwritten if
+        there isn't enough room (see `overflow`).
+        """
+        if len(rows) == 0:
+            return
+        if len(self._column_names) == 0:
+            self._set_columns(rows[0])
+        if self._fixed_capacity is not None and len(rows) > self._fixed_capacity:
+            rows = rows[-self._fixed_capacity :]
+        self.remove_first(self.overflow(len(rows)))
+        self._reserve(len(rows))
+        self._write(self._n, self._to_arrays(rows))
+        self._n += len(rows)
+
+    def extend_columns(self, arrays: Dict[str, np.ndarray]):
+        """Append rows given as one array per column
+
+        This is for derived data, rather than rows from the database.  The
+        column types are taken from the first arrays, later arrays are
+        cast to match.
+        """
+        nrows = len(next(iter(arrays.values())))
+        if nrows == 0:
+            return
+        if len(self._column_names) == 0:
+            self._column_names = list(arrays)
+            self._kinds = {
+                k: _kind_of_dtype(np.asarray(v).dtype) for k, v in arrays.items()
+            }
+        if self._fixed_capacity is not None and nrows > self._fixed_capacity:
+            arrays = {k: v[-self._fixed_capacity :] for k, v in arrays.items()}
+            nrows = self._fixed_capacity
+        self.remove_first(self.overflow(nrows))
+        self._reserve(nrows)
+        self._write(
+            self._n,
+            {
+                k: np.asarray(arrays[k], dtype=self._columns[k].dtype)
+                for k in self._column_names
+            },
+        )
+        self._n += nrows
+
+    def write_column(self, name: str, start: int, values):
+        """Overwrite values in column 'name', starting from logical row 'start'"""
+        self._write(start, {name: np.asarray(values, dtype=self._columns[name].dtype)})
+
+    def insertion_points(self, rows: List[Dict]) -> np.ndarray:
+        """Where each row (sorted by Datetime) belongs to keep the store sorted
+
+        Rows with the same time as an existing row go after it.
+        """
+        keys = np.array([row[SORT_BY].timestamp() for row in rows])
+        return np.searchsorted(self.sort_key(), keys, side="right")
+
+    def insert(self, position: int, rows: List[Dict]):
+        """Insert rows so that the first one ends up at logical 'position'
+
+        Only the rows after 'position' are moved.  The caller needs to
+        make room first if the store has a fixed capacity.
+        """
+        if len(rows) == 0:
+            return
+        if len(self._column_names) == 0:
+            self._set_columns(rows[0])
+        if self.overflow(len(rows)) > 0:
+            raise ValueError("Not enough room to insert rows")
+        self._reserve(len(rows))
+        arrays = self._to_arrays(rows)
+        i0 = self._head + position
+        i1 = self._head + self._n
+        for k, values in arrays.items():
+            tail = self._columns[k][i0:i1].copy()
+            arrays[k] = np.concatenate([values, tail])
+        self._write(position, arrays)
+        self._n += len(rows)
+        self._generation += 1
+
+    def sort_key(self) -> np.ndarray:
+        """Datetime of each row, as a float timestamp"""
+        if _SORT_KEY not in self._columns:
+            return np.empty(0)
+        return self._columns[_SORT_KEY][self._head : self._head + self._n]
+
+    def time_axis(self) -> np.ndarray:
+        """Datetime of each row, ready for plotting on a pyqtgraph DateAxisItem"""
+        if _TIME_AXIS not in self._columns:
+            return np.empty(0)
+        return self._columns[_TIME_AXIS][self._head : self._head + self._n]
+
+    def remove_first(self, nrows: int):
+        """Drop the oldest 'nrows' rows
+
+        No data are moved, the start of the store is simply advanced.
+        """
+        if nrows <= 0:
+            return
+        nrows = min(nrows, self._n)
+        self._n -= nrows
+        self._first_seq += nrows
+        if self._n == 0:
+            self._head = 0
+        elif self._fixed_capacity is not None:
+            self._head = (self._head + nrows) % self._capacity
+        else:
+            self._head += nrows
+
+    def remove_older_than(self, timestamp: float) -> int:
+        """Drop the oldest rows, up to the first with a Datetime from 'timestamp'
+
+        The rows don't need to be in time order (e.g. rows from several
+        detectors, one of which is catching up), but an old row which comes
+        after a recent one is kept.  Returns the number of rows dropped.
+        """
+        sort_key = self.sort_key()
+        if len(sort_key) == 0:
+            # no Datetime column
+            return 0
+        recent = np.flatnonzero(sort_key >= timestamp)
+        nrows = int(recent[0]) if len(recent) > 0 else len(sort_key)
+        self.remove_first(nrows)
+        return nrows
+
+    def remove_last(self, nrows: int):
+        """Drop the newest 'nrows' rows"""
+        if nrows <= 0:
+            return
+        self._n -= min(nrows, self._n)
+        self._generation += 1
+        if self._n == 0:
+            self._head = 0
+
+    def value(self, row: int, column: int):
+        """Value at (row, column), using integer positions"""
+        return self._columns[self._column_names[column]][self._head + row]
+
+    def column(self, name: str) -> np.ndarray:
+        """A view of the data in column 'name', oldest row first (don't modify it)"""
+        return self._columns[name][self._head : self._head + self._n]
+
+    def row(self, idx: int) -> Dict:
+        """Row 'idx' as a dict, in the same format as the input data"""
+        return {k: self._columns[k][self._head + idx] for k in self._column_names}
+
+    def to_rows(self, index=slice(None)) -> List[Dict]:
+        """Rows selected by 'index' (a slice, or array of row numbers) as a list
+        of dicts of Python values, i.e. in the same format as the input data"""
+        names = self._column_names
+        columns = [self.column(k)[index].tolist() for k in names]
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    def groups(self, name: str):
+        """The rows holding each distinct value of column 'name'
+
+        Returns a list of (value, row indices), sorted by value.  The
+        result is cached and kept up to date as rows are appended, so
+        several plots of the same store can share it.
+        """
+        index = self._group_indexes.get(name)
+        if index is None:
+            index = GroupIndex(self, name)
+            self._group_indexes[name] = index
+        return index.groups()
+
+
+def group_indices(values):
+    """Partition 'values' into groups, in a single pass
+
+    Returns a list of (value, indices), sorted by value, where the indices
+    are in their original order.
+    """
+    values = np.asarray(values)
+    labels, inverse = np.unique(values, return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="stable")
+    splits = np.cumsum(np.bincount(inverse, minlength=len(labels)))[:-1]
+    return list(zip(labels, np.split(order, splits)))
+
+
+class _IndexArray(object):
+    """A growable array of (increasing) row numbers"""
+
+    def __init__(self):
+        self.data = np.empty(16, dtype=np.int64)
+        self.n = 0
+
+    def extend(self, values):
+        needed = self.n + len(values)
+        if needed > len(self.data):
+            data = np.empty(max(needed, 2 * len(self.data)), dtype=np.int64)
+            data[: self.n] = self.data[: self.n]
+            self.data = data
+        self.data[self.n : needed] = values
+        self.n = needed
+
+    def drop_below(self, seq) -> np.ndarray:
+        """Forget numbers less than 'seq', returning the rest (a view)"""
+        values = self.data[: self.n]
+        i = np.searchsorted(values, seq)
+        if i > self.n // 2:
+            # reclaim the space used by dropped rows
+            self.data[: self.n - i] = values[i:]
+            self.n -= i
+            i = 0
+        return self.data[i : self.n]
+
+
+class GroupIndex(object):
+    """Row indices of each distinct value in one column of a ColumnStore
+
+    Rows are identified by their arrival number, so appending rows only
+    requires the new rows to be classified, and dropping old rows only
+    moves the start of each group.  Anything else which renumbers the
+    rows (e.g. inserting in the middle) causes a rebuild.
+    """
+
+    def __init__(self, store: ColumnStore, name: str):
+        self._store = store
+        self._name = name
+        self._generation = None
+        self._seq_end = 0
+        self._rows: Dict[object, _IndexArray] = {}
+        self._cache_key = None
+        self._cache = []
+
+    def _update(self):
+        store = self._store
+        if self._generation != store._generation:
+            self._generation = store._generation
+            self._rows = {}
+            self._seq_end = store.first_seq
+        if store.seq_end == self._seq_end:
+            return
+        first_seq = max(self._seq_end, store.first_seq)
+        values = store.column(self._name)[first_seq - store.first_seq :]
+        for label, idx in group_indices(values):
+            rows = self._rows.get(label)
+            if rows is None:
+                rows = _IndexArray()
+                self._rows[label] = rows
+            rows.extend(idx + first_seq)
+        self._seq_end = store.seq_end
+
+    def groups(self):
+        self._update()
+        store = self._store
+        key = (self._generation, store.first_seq, store.seq_end)
+        if key == self._cache_key:
+            return self._cache
+        groups = []
+        for label in sorted(self._rows):
+            rows = self._rows[label].drop_below(store.first_seq)
+            if len(rows) == 0:
+                del self._rows[label]
+                continue
+            groups.append((label, rows - store.first_seq))
+        self._cache_key = key
+        self._cache = groups
+        return groups
@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+
+from ansto_radon_monitor.configuration import config_from_inifile
+from ansto_radon_monitor.main import setup_logging
+from ansto_radon_monitor.main_controller import initialize
+from startup_trace import trace as startup_trace
+
+_logger = logging.getLogger(__name__)
+
+
+class ControllerLoader(object):
+    """Load a configuration and start the instrument controller in the background
+
+    This lets acquisition start while the GUI is still busy, e.g. showing
+    the "Resume logging?" countdown.  If the controller isn't wanted after
+    all, `cancel` shuts it down (straight away, or as soon as it has
+    started).
+    """
+
+    def __init__(self, config_fname):
+        self.config_fname = config_fname
+        self.config = None
+        self.instrument_controller = None
+        self.config_error = None
+        self.init_error = None
+        self.cancelled = False
+        # time.perf_counter() when the controller was ready
+        self.ready_time = None
+        self._lock = threading.Lock()
+        self._config_done = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="ControllerLoader", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        try:
+            _logger.debug(f"Reading configuration from {self.config_fname}")
+            with startup_trace.phase("config_from_inifile"):
+                config = config_from_inifile(self.config_fname)
+            self.config = config
+        except Exception as ex:
+            self.config_error = ex
+            return
+        finally:
+            # the config (or the error) has been stored by now
+            self._config_done.set()
+        if self.cancelled:
+            return
+        try:
+            setup_logging(config.loglevel, config.logfile)
+            with startup_trace.phase("initialize"):
+                ic = initialize(config, mode="thread")
+        except Exception as ex:
+            self.init_error = ex
+            return
+        self.ready_time = time.perf_counter()
+        with self._lock:
+            shutdown = self.cancelled
+            if not shutdown:
+                self.instrument_controller = ic
+        if shutdown:
+            _logger.info("Logging was cancelled, shutting down instrument controller")
+            ic.shutdown()
+
+    def get_config(self):
+        """Wait for the configuration, raising any error from reading it"""
+        self._config_done.wait()
+        if self.config_error is not None:
+            raise self.config_error
+        return self.config
+
+    def get_instrument_controller(self):
+        """Wait for the instrument controller, raising any error from starting it"""
+        self._thread.join()
+        if self.init_error is not None:
+            raise self.init_error
+        return self.instrument_controller
+
+    def cancel(self):
+        """Don't start the instrument controller, or shut it down if it has started"""
+        with self._lock:
+            self.cancelled = True
+            ic = self.instrument_controller
+            self.instrument_controller = None
+        if ic is not None:
+            _logger.info("Logging was cancelled, shutting down instrument controller")
+            ic.shutdown()
@@ -6,8 +6,11 @@ import typing
 
 import numpy as np
 import pyqtgraph as pg
-from plotutils import data_to_columns, get_pen, groupby_series
+from aggregates import AggregatePyramid
+from column_store import ColumnStore
+from plotutils import DecimatedCurve, SeriesBuffers, get_pen
 from PyQt5 import QtCore, QtWidgets
+from table_hub import accepts_end_time
 
 _logger = logging.getLogger(__name__)
 
@@ -15,26 +18,71 @@ _logger = logging.getLogger(__name__)
 # PgPlot examples:
 # python ...\env\lib\site-packages\pyqtgraph\examples\ExampleApp.py
 
+# TODO: this will need to change if we decide to support more than just the Results table
+results_plot_columns = [
+    "ApproxRadon",
+    "LLD_Tot",
+    "ULD_Tot",
+    "ExFlow_Tot",
+    "InFlow_Avg",
+    "HV_Avg",
+    "AirT_Avg",
+]
+
+
+def load_plot_history(
+    ic, newest_age: datetime.timedelta, oldest_age: datetime.timedelta
+):
+    """Summarise one chunk of the Results which are too old for the plot buffers
+
+    Rows from 'oldest_age' ago, up to 'newest_age' ago, are loaded and
+    reduced into an AggregatePyramid.  This is slow, so it is meant to
+    run in a background thread.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    start_time = now - oldest_age
+    if accepts_end_time(ic):
+        t, rows = ic.get_rows(
+            "Results", start_time=start_time, end_time=now - newest_age
+        )
+    else:
+        t, rows = ic.get_rows("Results", start_time=start_time)
+    # same convention as the TableHub uses for trimming its cache
+    cutoff = time.time() - newest_age.total_seconds()
+    rows = [itm for itm in rows if itm["Datetime"].timestamp() < cutoff]
+    pyramid = AggregatePyramid(results_plot_columns)
+    if len(rows) == 0:
+        return pyramid
+    series = SeriesBuffers(results_plot_columns, huevar="DetectorName")
+    series.update(ColumnStore(rows))
+    for label, s in series.series.items():
+        pyramid.add(
+            label, s.column("x"), {k: s.column(k) for k in results_plot_columns}
+        )
+    return pyramid
+
 
 class DataPlotter(object):
-    def __init__(self, win: pg.GraphicsLayoutWidget, data: typing.List):
+    def __init__(
+        self,
+        win: pg.GraphicsLayoutWidget,
+        data: ColumnStore,
+        history: typing.Optional[AggregatePyramid] = None,
+    ):
+        # each detector keeps the same color, even if others come and go
+        self._colors = {}
+        # coarse summaries of the data, used when zoomed out past the raw data
+        self.history = history
+        # the history level being drawn, or None for the raw data
+        self._level = None
         self.setup(win, data)
         self.flag_setup_neeeded = False
 
-    def setup(self, win: pg.GraphicsLayoutWidget, data):
+    def setup(self, win: pg.GraphicsLayoutWidget, data: ColumnStore):
         self.win: pg.GraphicsLayoutWidget = win
         # persistant storage of plot info needed for updates
         self._plot_objects = {}
-        # TODO: this will need to change if we decide to support more than just the Results table
-        plot_yvars = [
-            "ApproxRadon",
-            "LLD_Tot",
-            "ULD_Tot",
-            "ExFlow_Tot",
-            "InFlow_Avg",
-            "HV_Avg",
-            "AirT_Avg",
-        ]
+        plot_yvars = results_plot_columns
         self._units_dict = {
             "ApproxRadon": "Bq/m³",
             "LLD_Tot": "/30-min",
@@ -57,21 +105,20 @@ class DataPlotter(object):
         N = len(plot_yvars)
         win.resize(400, 100 * N)
 
-        datac = data_to_columns(data)
-        datac["Datetime"] = np.array(
-            [itm.timestamp() + time.timezone for itm in datac["Datetime"]]
-        )
+        # one series per detector, shared by all of the panels
+        self._series = SeriesBuffers(plot_yvars, huevar="DetectorName")
+        self._series.update(data)
+        self._add_history()
+        self._labels = self._series.labels()
+        self._level = None
 
         for idx, k in enumerate(plot_yvars):
-            self.plot(
-                win,
-                data=datac,
-                xvar="Datetime",
-                yvar=k,
-                huevar="DetectorName",
-                idx=idx,
-                Nplts=N,
-            )
+            self.plot(win, yvar=k, idx=idx, Nplts=N)
+
+        # the panels share an x-axis, so watch the first one for zooming
+        vb = self._plot_objects[0]["plot"].getViewBox()
+        vb.sigXRangeChanged.connect(self._on_view_changed)
+        vb.sigResized.connect(self._on_view_changed)
         
         # set the width of the y-labels so that the axes align
         try:
@@ -87,21 +134,10 @@ class DataPlotter(object):
 
         self.flag_setup_neeeded = False
 
-    def plot(self, win: pg.GraphicsLayoutWidget, data, xvar, yvar, huevar, idx, Nplts):
+    def plot(self, win: pg.GraphicsLayoutWidget, yvar, idx, Nplts):
         po = {}
-        po["xvar"] = xvar
         po["yvar"] = yvar
-        po["huevar"] = huevar
         po["idx"] = idx
-        try:
-            x = data[xvar]
-            # conversion into dtype=float converts None values into nan
-            y = np.array(data[yvar], dtype=float)
-            legend_data = data[huevar]
-        except Exception as e:
-            _logger.error(f"Encounted error while generating plot: {e}")
-            print(str(data.keys()))
-            return
         p = win.addPlot(
             row=idx,
             col=0,
@@ -123,56 +159,126 @@ class DataPlotter(object):
         p.getAxis("left").enableAutoSIPrefix(False)
         po["plot"] = p
         po["series"] = {}
-        if idx == Nplts - 1 and len(set(legend_data)) > 1:
+        if idx == Nplts - 1 and len(self._labels) > 1:
             # add legend to the bottom plot, if there are more than one
             # detectors
             legend = p.addLegend(frame=False, rowCount=1, colCount=2)
             self._plot_objects["legend"] = legend
 
-        for series_idx, (x, y, label) in enumerate(groupby_series(x, y, legend_data)):
-            s = p.plot(x, y, pen=get_pen(series_idx), name=label)
-            po["series"][series_idx] = s
+        for label in self._labels:
+            po["series"][label] = self._add_curve(p, label, yvar)
 
         self._plot_objects[idx] = po
 
+    def _get_pen(self, label):
+        return get_pen(self._colors.setdefault(label, len(self._colors)))
+
+    def _add_curve(self, p, label, yvar):
+        s = DecimatedCurve(p, pen=self._get_pen(label), name=label)
+        s.setData(*self._curve_data(label, yvar))
+        return s
+
+    def _curve_data(self, label, yvar):
+        """x, y for one curve, from the raw data or from the history level"""
+        if self._level is None:
+            data = self._series.series[label]
+            # the curves are given views of the series, not copies
+            return data.column("x"), data.column(yvar)
+        if label not in self.history.labels:
+            empty = np.empty(0)
+            return empty, empty
+        t, mean, ymin, ymax, n = self.history.level_data(label, self._level, yvar)
+        return t, mean
+
+    def _add_history(self):
+        """Add the rows which are new since the last update to the history"""
+        if self.history is None:
+            return
+        for label, s in self._series.series.items():
+            x = s.column("x")
+            span = self.history.coverage(label)
+            i0 = 0 if span is None else np.searchsorted(x, span[1], side="right")
+            if i0 < len(x):
+                self.history.add(
+                    label,
+                    x[i0:],
+                    {k: s.column(k)[i0:] for k in results_plot_columns},
+                )
+
+    def _choose_level(self):
+        """Pick a history level to suit the view, or None for the raw data"""
+        if self.history is None or len(self.history.labels) == 0:
+            return None
+        vb = self._plot_objects[0]["plot"].getViewBox()
+        if vb.autoRangeEnabled()[0]:
+            # auto-ranging would zoom out to show all of the history
+            return None
+        (x0, x1), _ = vb.viewRange()
+        pixels = vb.width()
+        if pixels < 1:
+            return self._level
+        level = self.history.choose_level((x1 - x0) / pixels)
+        if level < 0:
+            starts = [
+                s.column("x")[0] for s in self._series.series.values() if len(s) > 0
+            ]
+            if len(starts) > 0 and x0 >= min(starts):
+                return None
+            # zoomed in on a time before the raw data, so use the finest level
+            level = 0
+        return level
+
+    def _on_view_changed(self, *args):
+        level = self._choose_level()
+        if level != self._level:
+            _logger.debug(f"Plotting history level {level}")
+            self._level = level
+            self._redraw(rebuilt=True)
+
+    def _redraw(self, rebuilt):
+        for idx, po in self._plot_objects.items():
+            if idx == "legend":
+                continue
+            for label, s in po["series"].items():
+                s.setData(*self._curve_data(label, po["yvar"]), rebuilt=rebuilt)
+
+    def _update_labels(self, labels):
+        """Add and remove curves (and legend entries) as detectors come and go"""
+        removed = [itm for itm in self._labels if itm not in labels]
+        added = [itm for itm in labels if itm not in self._labels]
+        panels = [po for k, po in self._plot_objects.items() if k != "legend"]
+        if "legend" not in self._plot_objects and len(labels) > 1:
+            # add legend to the bottom plot, now that there are more than one
+            # detectors
+            po = panels[-1]
+            legend = po["plot"].addLegend(frame=False, rowCount=1, colCount=2)
+            for label, s in po["series"].items():
+                legend.addItem(s.curve, label)
+            self._plot_objects["legend"] = legend
+        for po in panels:
+            for label in removed:
+                # this also removes the legend entry
+                po["series"].pop(label).remove()
+            for label in added:
+                po["series"][label] = self._add_curve(po["plot"], label, po["yvar"])
+        self._labels = labels
+
     def clear(self):
         self.win.clear()
         self.flag_setup_neeeded = True
 
-    def update(self, data):
+    def update(self, data: ColumnStore):
         if self.flag_setup_neeeded:
             # regenerate the entire plot
             self.win.clear()
             self.setup(self.win, data)
             return
 
-        flag_need_regenerate = False
-        datac = data_to_columns(data)
-        for idx, po in self._plot_objects.items():
-            if idx == "legend":
-                continue
-            x = po["xvar"]
-            y = po["yvar"]
-            hue = po["huevar"]
-            idx = po["idx"]
-            x = datac[x]
-            # conversion into dtype=float converts None values into nan
-            y = np.array(datac[y], dtype=float)
-            legend_data = datac[hue]
-
-            for series_idx, (x, y, label) in enumerate(
-                groupby_series(x, y, legend_data)
-            ):
-                try:
-                    s = po["series"][series_idx]
-                    # subtract time.timezone to get display in UTC
-                    xfloat = [itm.timestamp() + time.timezone for itm in x]
-                    s.setData(x=xfloat, y=y)
-                except KeyError:
-                    # update failed, plot needs to be regenerated
-                    flag_need_regenerate = True
-
-        if flag_need_regenerate:
-            # regenerate the entire plot
-            self.win.clear()
-            self.setup(self.win, data)
+        # only the rows which are new since the last update are converted
+        rebuilt = self._series.update(data)
+        self._add_history()
+        labels = self._series.labels()
+        if labels != self._labels:
+            self._update_labels(labels)
+        # the history levels are re-read in full (they are small)
+        self._redraw(rebuilt=rebuilt or self._level is not None)
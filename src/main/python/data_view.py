@@ -1,4 +1,5 @@
 import datetime
+import functools
 import logging
 import math
 import time
@@ -6,57 +7,179 @@ from typing import Dict
 
 import numpy as np
 import pyqtgraph as pg
-from plotutils import groupby_series
+from column_store import ColumnStore
+from plotutils import DecimatedCurve, SeriesBuffers, StepSeries, groupby_series
 from PyQt5 import QtCore, QtWidgets
 from PyQt5.QtCore import QSettings, Qt, QTimer
 from pyqtgraph import PlotWidget
+from table_hub import accepts_end_time
 from ui_data_view import Ui_DataViewForm
 
 _logger = logging.getLogger(__name__)
 
 
+def _format_float(value):
+    # Render float to 2 dp
+    return "%.2f" % value
+
+
+def _format_value(value):
+    # Perform per-type checks and render accordingly.
+    if isinstance(value, datetime.datetime):
+        # Render date and time
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+
+    if isinstance(value, float):
+        # Render float to 2 dp
+        return "%.2f" % value
+
+    if isinstance(value, str):
+        # Render strings just as-is
+        return value
+
+    # Default (anything not captured above: e.g. int)
+    return str(value)
+
+
+# Maximum number of rows to keep in a table view.  This can be set per-table
+# in the QSettings store with the key "max_rows/<table name>"
+default_max_rows = 8640  # enough for 24h of 10 sec values
+
+
+# Number of rows to load at a time when scrolling through history
+default_page_rows = 1000
+# Give up looking for older data if none is found this far back (seconds)
+max_history_span = 366 * 24 * 3600
+# If the instrument controller can't limit a query to an end time, each
+# query covers about this many pages either side of the one requested and
+# the extra rows are kept for the next request
+spool_pages = 3
+
+
+def _by_time(rows):
+    return sorted(rows, key=lambda x: x["Datetime"])
+
+
+def _newest_rows(rows, limit):
+    """The last 'limit' rows (sorted by time), without splitting a timestamp
+
+    If the oldest timestamp in the page would be split, it is left for the
+    next page, unless that would leave the page empty.
+    """
+    rows = _by_time(rows)
+    if len(rows) <= limit:
+        return rows
+    page = rows[-limit:]
+    t0 = page[0]["Datetime"]
+    if rows[-limit - 1]["Datetime"] == t0:
+        page = [itm for itm in page if itm["Datetime"] > t0] or page
+    return page
+
+
+def _oldest_rows(rows, limit):
+    """The first 'limit' rows (sorted by time), and whether there are more
+
+    The page ends on a change in time, so no timestamp is split.
+    """
+    rows = _by_time(rows)
+    if len(rows) <= limit:
+        return rows, False
+    t_end = rows[limit - 1]["Datetime"]
+    return [itm for itm in rows if itm["Datetime"] <= t_end], True
+
+
 class TableModel(QtCore.QAbstractTableModel):
-    def __init__(self, data):
+    """Table of rows, sorted by time, for display in a QTableView
+
+    If a fetch_rows function and a FetchService are provided, older data can
+    be loaded a page at a time with fetch_older().  fetch_rows(start_time,
+    end_time=None) is called from a worker thread and should return the rows
+    (a list of dicts) from start_time onwards and, if end_time is given,
+    before end_time.  Pages are cut to size in the worker thread too.  The
+    total number of rows is limited to max_rows, so loading history evicts
+    the newest rows, which are then fetched again a page at a time (via Qt's
+    canFetchMore/fetchMore) when the view scrolls back down to the bottom.
+    """
+
+    # emitted after older rows have been inserted at the top of the
+    # table, argument is the number of rows
+    history_loaded = QtCore.pyqtSignal(int)
+
+    def __init__(
+        self,
+        data,
+        max_rows=default_max_rows,
+        fetch_rows=None,
+        fetch_service=None,
+        page_rows=default_page_rows,
+    ):
         super(TableModel, self).__init__()
-        self._data = data
-        if len(data) > 0:
-            self._column_names = list(data[0])
-        else:
-            self._column_names = []
+        self.max_rows = max_rows
+        # data is stored column-wise, one array per column, in a circular
+        # buffer which holds the most recent max_rows rows
+        self._data = ColumnStore(data, capacity=max_rows)
+        self._formatters = self._make_formatters()
+
+        self._fetch_rows = fetch_rows
+        self._fetch_service = fetch_service
+        self.page_rows = min(page_rows, max_rows // 2)
+        self._fetch_in_progress = False
+        # incremented whenever the model is reset, so that the results of
+        # fetches which were started before the reset can be ignored
+        self._generation = 0
+        self._reset_history()
+
+    def _reset_history(self):
+        self._generation += 1
+        self._history_exhausted = False
+        # time span (seconds) to request when looking for older data
+        self._history_span = None
+        # set to True when the newest rows have been evicted to make room
+        # for history, live data is ignored until they have been re-fetched
+        self._tail_evicted = False
+        # after the evicted rows have been re-fetched, live rows up to this
+        # time might already be in the table
+        self._reloaded_until = None
+
+    @property
+    def store(self) -> ColumnStore:
+        """The data, as columns (read-only)"""
+        return self._data
+
+    @property
+    def _column_names(self):
+        return self._data.column_names
+
+    def _make_formatters(self):
+        """Choose a function to render each column, based on the column's type
+
+        Object columns (datetimes, strings, or a mixture of things) are
+        checked value-by-value, typed columns are formatted directly
+        """
+        formatters = []
+        for k in self._column_names:
+            dtype = self._data.column(k).dtype
+            if dtype.kind == "f":
+                formatters.append(_format_float)
+            elif dtype.kind in "iu":
+                formatters.append(str)
+            else:
+                formatters.append(_format_value)
+        return formatters
 
     def data(self, index, role):
         if role == Qt.DisplayRole:
+            col = index.column()
             # Get the raw value
-            value = list(self._data[index.row()].values())[index.column()]
-
-            # Perform per-type checks and render accordingly.
-            if isinstance(value, datetime.datetime):
-                # Render date and time
-                return value.strftime("%Y-%m-%d %H:%M:%S")
-
-            if isinstance(value, float):
-                # Render float to 2 dp
-                return "%.2f" % value
-
-            if isinstance(value, str):
-                # Render strings just as-is
-                return value
-
-            # Default (anything not captured above: e.g. int)
-            return str(value)
+            value = self._data.value(index.row(), col)
+            return self._formatters[col](value)
 
     def rowCount(self, index):
-        # The length of the outer list.
         return len(self._data)
 
     def columnCount(self, index):
-        # The following takes the first dict, and returns
-        # the length (only works if all rows are an equal length)
-        if len(self._data) > 0:
-            ncols = len(self._data[0])
-        else:
-            ncols = 0
-        return ncols
+        # Columns are only known once the first row has arrived
+        return len(self._column_names)
 
     def headerData(self, section, orientation, role):
         # section is the index of the column/row.
@@ -73,15 +196,11 @@ class TableModel(QtCore.QAbstractTableModel):
             # no-op
             return
         self.beginResetModel()
-        self._data = new_data
-        self._column_names = list(new_data[0])
+        self._data = ColumnStore(new_data, capacity=self.max_rows)
+        self._formatters = self._make_formatters()
+        self._reset_history()
         self.endResetModel()
 
-    # def append_data(self, new_data):
-    #    self.beginResetModel()
-    #    self._data.extend(new_data)
-    #    self.endResetModel()
-
     def append_data(self, new_data):
 
         N = len(self._data)
@@ -89,11 +208,22 @@ class TableModel(QtCore.QAbstractTableModel):
         if Nnew == 0:
             return
 
+        if self._tail_evicted:
+            # the view is showing history and the newest rows aren't loaded,
+            # new data will be picked up by fetchMore instead
+            return
+
         if N == 0:
             # can't trust existing column names - reset
             self.update_data(new_data)
             return
 
+        if self._reloaded_until is not None:
+            new_data = self._drop_reloaded(new_data)
+            Nnew = len(new_data)
+            if Nnew == 0:
+                return
+
         if not (self._column_names) == list(new_data[0]):
             # new data looks different to old data - reset
             import traceback
@@ -105,49 +235,249 @@ class TableModel(QtCore.QAbstractTableModel):
             self.update_data(new_data)
             return
 
-        if (
-            "Datetime" in self._column_names
-            and not self._data[-1]["Datetime"] <= new_data[0]["Datetime"]
-        ):
-            # print("new data breaks sorting, resetting model")
-            # appending new data would make the model no longer sorted by date
-            # (new data are sorted, and old data are sorted)
-            data = []
-            data.extend(self._data)
-            data.extend(new_data)
-            data.sort(key=lambda x: x["Datetime"])
-            self.update_data(data)
-            return
+        sort_key = self._data.sort_key()
+        if len(sort_key) > 0:
+            t_new = np.array([row["Datetime"].timestamp() for row in new_data])
+            if t_new[0] < sort_key[-1] or np.any(np.diff(t_new) < 0):
+                # appending new data would make the model no longer sorted by
+                # date (e.g. backlogged rows from a detector which has
+                # reconnected) so merge them into place instead
+                self.merge_data(new_data)
+                return
+
+        if Nnew > self.max_rows:
+            new_data = new_data[-self.max_rows :]
+            Nnew = len(new_data)
+
+        # remove the oldest rows if the maximum would be exceeded, this is
+        # cheap because the buffer only needs to move its start position
+        N_to_remove = self._data.overflow(Nnew)
+        if N_to_remove > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, N_to_remove - 1)
+            self._data.remove_first(N_to_remove)
+            self.endRemoveRows()
+            N = len(self._data)
 
         # print(f"new data:{new_data}, length {N}, {N+len(new_data)-1}")
-        self.beginInsertRows(QtCore.QModelIndex(), N, N + len(new_data) - 1)
+        self.beginInsertRows(QtCore.QModelIndex(), N, N + Nnew - 1)
         self._data.extend(new_data)
+        # a column might have been converted to 'object' to hold the new data
+        self._formatters = self._make_formatters()
         self.endInsertRows()
 
         assert len(self._data) == N + Nnew
 
-        # remove rows if maximum has been exceeded
-        N_max = 8640  # TODO: config?  Now, use enough for 24h of 10 sec values
-        if len(self._data) > N_max:
-            N_to_remove = len(self._data) - N_max
+    def _drop_reloaded(self, new_data):
+        """Remove rows which fetchMore has already put into the table
+
+        The live rows which arrive just after the tail has been re-fetched
+        can overlap with the re-fetched rows.  Rows are identified by their
+        time and detector name.
+        """
+        sort_key = self._data.sort_key()
+        t_new = [row["Datetime"].timestamp() for row in new_data]
+        i0 = np.searchsorted(sort_key, min(t_new), side="left")
+        if "DetectorName" in self._column_names:
+            names = self._data.column("DetectorName")[i0:]
+        else:
+            names = [None] * (len(sort_key) - i0)
+        loaded = set(zip(sort_key[i0:], names))
+        if min(t_new) > self._reloaded_until:
+            # past the overlap
+            self._reloaded_until = None
+        return [
+            row
+            for t, row in zip(t_new, new_data)
+            if (t, row.get("DetectorName")) not in loaded
+        ]
+
+    def merge_data(self, new_data):
+        """Insert rows which belong somewhere other than the end of the table
+
+        Each contiguous run of new rows is inserted in one go, so that
+        the view only needs to update the rows which actually changed.
+        """
+        new_data = sorted(new_data, key=lambda x: x["Datetime"])
+        positions = self._data.insertion_points(new_data)
+        # split into runs of rows which are inserted at the same position
+        breaks = np.flatnonzero(np.diff(positions)) + 1
+        run_starts = np.r_[0, breaks]
+        run_ends = np.r_[breaks, len(new_data)]
+        # the number of rows inserted, minus the number removed, so far
+        offset = 0
+        for i0, i1 in zip(run_starts, run_ends):
+            run = new_data[i0:i1]
+            pos = positions[i0] + offset
+            N_over = self._data.overflow(len(run))
+            if N_over > 0:
+                # make room by removing the oldest rows, which might include
+                # some of the rows from this run
+                N_to_remove = min(N_over, pos)
+                if N_to_remove > 0:
+                    self.beginRemoveRows(QtCore.QModelIndex(), 0, N_to_remove - 1)
+                    self._data.remove_first(N_to_remove)
+                    self.endRemoveRows()
+                    offset -= N_to_remove
+                    pos -= N_to_remove
+                run = run[N_over - N_to_remove :]
+                if len(run) == 0:
+                    continue
+            self.beginInsertRows(QtCore.QModelIndex(), pos, pos + len(run) - 1)
+            self._data.insert(pos, run)
+            self._formatters = self._make_formatters()
+            self.endInsertRows()
+            offset += len(run)
+
+    def _start_fetch(self, on_finished, fn, *args):
+        self._fetch_in_progress = self._fetch_service.request(
+            ("history", id(self)),
+            functools.partial(fn, *args),
+            callback=functools.partial(on_finished, self._generation),
+            error_callback=self._on_fetch_failed,
+        )
+
+    def _fetch_older_page(self, start_time, end_time, limit):
+        """The newest 'limit' rows in [start_time, end_time) (in a worker thread)"""
+        return _newest_rows(self._fetch_rows(start_time, end_time), limit)
+
+    def _fetch_newer_page(self, start_time, end_time, limit):
+        """The first 'limit' rows after start_time (in a worker thread)
+
+        Rows up to end_time are fetched first, and only if there aren't
+        enough of them is the rest of the table (up to now) fetched.
+        Returns the rows and whether there are more to come.
+        """
+        t0 = start_time
+        rows = [itm for itm in self._fetch_rows(t0, end_time) if itm["Datetime"] > t0]
+        if len(rows) < limit:
+            rows += self._fetch_rows(end_time)
+        return _oldest_rows(rows, limit)
+
+    def _page_span(self):
+        """Guess the time span (seconds) of one page from the rows we have"""
+        sort_key = self._data.sort_key()
+        dt = (sort_key[-1] - sort_key[0]) / max(len(sort_key) - 1, 1)
+        return max(dt * self.page_rows, 3600.0)
+
+    def _on_fetch_failed(self, error):
+        self._fetch_in_progress = False
+
+    def _is_stale(self, generation):
+        """Finish a fetch, returning True if the model was reset meanwhile"""
+        self._fetch_in_progress = False
+        return generation != self._generation or len(self._data) == 0
+
+    def can_fetch_older(self):
+        return (
+            self._fetch_service is not None
+            and not self._fetch_in_progress
+            and not self._history_exhausted
+            and len(self._data.sort_key()) > 0
+        )
+
+    def fetch_older(self):
+        """Start loading the page of rows before the first row, in the background"""
+        if not self.can_fetch_older():
+            return
+        if self._history_span is None:
+            self._history_span = self._page_span()
+        t_first = self._data.column("Datetime")[0]
+        start_time = t_first - datetime.timedelta(seconds=self._history_span)
+        self._start_fetch(
+            self._on_older_rows,
+            self._fetch_older_page,
+            start_time,
+            t_first,
+            self.page_rows,
+        )
+
+    def _on_older_rows(self, generation, rows):
+        if self._is_stale(generation):
+            # model was reset while the fetch was running
+            return
+        sort_key = self._data.sort_key()
+        t_oldest = sort_key[0]
+        page = [itm for itm in rows if itm["Datetime"].timestamp() < t_oldest]
+        if len(page) == 0:
+            # nothing found, try looking further back next time
+            if self._history_span >= max_history_span:
+                self._history_exhausted = True
+            self._history_span = min(self._history_span * 4, max_history_span)
+            return
+
+        # evict the newest rows (at the bottom of the view, off-screen) to
+        # make room.  Only whole timestamps are evicted, so that fetchMore
+        # can pick up from the last remaining row.
+        N = len(self._data)
+        N_evict = self._data.overflow(len(page))
+        if N_evict > 0:
+            N_keep = np.searchsorted(sort_key, sort_key[N - N_evict], side="left")
+            self.beginRemoveRows(QtCore.QModelIndex(), N_keep, N - 1)
+            self._data.remove_last(N - N_keep)
+            self.endRemoveRows()
+            self._tail_evicted = True
+            if N_keep == 0:
+                # pathological case - lots of rows with the same time
+                page = page[-self.max_rows :]
+
+        self.beginInsertRows(QtCore.QModelIndex(), 0, len(page) - 1)
+        self._data.insert(0, page)
+        self._formatters = self._make_formatters()
+        self.endInsertRows()
+        self.history_loaded.emit(len(page))
+
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+        return self._tail_evicted and not self._fetch_in_progress
+
+    def fetchMore(self, parent):
+        """Start re-loading rows which were evicted from the bottom of the table"""
+        if not self.canFetchMore(parent):
+            return
+        t_last = self._data.column("Datetime")[-1]
+        # a little more than one page, so that the page is usually full
+        end_time = t_last + datetime.timedelta(seconds=1.5 * self._page_span())
+        self._start_fetch(
+            self._on_newer_rows,
+            self._fetch_newer_page,
+            t_last,
+            end_time,
+            self.page_rows,
+        )
+
+    def _on_newer_rows(self, generation, result):
+        if self._is_stale(generation):
+            return
+        rows, more = result
+        t_newest = self._data.sort_key()[-1]
+        newer = [itm for itm in rows if itm["Datetime"].timestamp() > t_newest]
+        if not more:
+            # this is the last page, live updates can resume
+            self._tail_evicted = False
+            if len(newer) > 0:
+                self._reloaded_until = newer[-1]["Datetime"].timestamp()
+        N = len(self._data)
+        N_to_remove = self._data.overflow(len(newer))
+        if N_to_remove > 0:
             self.beginRemoveRows(QtCore.QModelIndex(), 0, N_to_remove - 1)
-            self._data = self._data[N_to_remove:]
-            assert len(self._data) == N_max
+            self._data.remove_first(N_to_remove)
             self.endRemoveRows()
+            N = len(self._data)
+            # older history has been evicted from the top
+            self._history_exhausted = False
+        if len(newer) > 0:
+            self.beginInsertRows(QtCore.QModelIndex(), N, N + len(newer) - 1)
+            self._data.extend(newer)
+            self._formatters = self._make_formatters()
+            self.endInsertRows()
 
     def get_plot_data(self, column_idx):
+        """Column name and values (an array view, not a copy) for plotting"""
         if len(self._data) == 0:
             return "", []
-        values = [list(row.values())[column_idx] for row in self._data]
-        colname = list(self._data[0].keys())[column_idx]
-        return colname, values
-
-    def get_detector_name_data(self):
-        if "DetectorName" in self._data[0]:
-            values = [row["DetectorName"] for row in self._data]
-        else:
-            values = None
-        return values
+        colname = self._column_names[column_idx]
+        return colname, self._data.column(colname)
 
 
 class DataViewForm(QtWidgets.QWidget, Ui_DataViewForm):
@@ -188,17 +518,34 @@ class DataViewForm(QtWidgets.QWidget, Ui_DataViewForm):
         self.table_name = table_name
         self.selected_column = None
 
-        self.model = TableModel([])
+        max_rows = main_window.qsettings.value(
+            f"max_rows/{table_name}", default_max_rows, type=int
+        )
+        # (instrument controller, start, end, rows) kept by _spooled_rows,
+        # only used from the worker thread
+        self._spool = None
+        self.model = TableModel(
+            [],
+            max_rows=max_rows,
+            fetch_rows=self.fetch_rows,
+            fetch_service=main_window.fetch_service,
+        )
         self.pastDataTableView.setModel(self.model)
-        # the last time this table was updated
-        self.last_update_time = None
+        # True once the first batch of data has arrived
+        self.have_data = False
         self.last_redraw_time = 0
         # this is set to True when there is new data which hasn't yet
         # been drawn on the plot
         self.flag_new_plot_data = False
         # for detecting a change in column
         self.previous_selected_column = -1
+        # the step plot of the selected column, see reset_step_plot
+        self.step_series = None
+        self.step_curves = {}
+        self.step_colors = {}
+        self.step_plot_dark_mode = None
 
+        self._shown_time = 0.0
         self.connect_signals()
 
         self.update_times: Dict[str, datetime.datetime] = {}
@@ -213,20 +560,32 @@ class DataViewForm(QtWidgets.QWidget, Ui_DataViewForm):
         )
         self.legend = None
 
+        # last, because rows may arrive as soon as this is called
+        self.subscribe()
+
     def get_color(self, idx):
         N = len(self._colormap)
         return self._colormap[idx % N]
 
     def connect_signals(self):
-        self.redraw_timer = QTimer()
-        self.redraw_timer.setInterval(1000)
-        self.redraw_timer.timeout.connect(self.update_displays)
-        self.redraw_timer.start()
+        # redraw once per second, while visible
+        self.main_window.scheduler.register(
+            f"DataViewForm.{self.table_name}",
+            self.update_displays,
+            interval=1.0,
+            widget=self,
+        )
 
         self.pastDataTableView.selectionModel().currentChanged.connect(
             self.table_selected
         )
 
+        # load older data when the table is scrolled to the top
+        self.pastDataTableView.verticalScrollBar().valueChanged.connect(
+            self.on_table_scrolled
+        )
+        self.model.history_loaded.connect(self.on_history_loaded)
+
         # TODO: chase up how to extract the column names from a selection range
         # rather than just the position.
 
@@ -245,6 +604,63 @@ class DataViewForm(QtWidgets.QWidget, Ui_DataViewForm):
         # print(f'{c0,r0}')
         self.selected_column = idx.column()
 
+    def fetch_rows(self, start_time, end_time=None):
+        """Fetch rows from [start_time, end_time) (called from a worker thread)"""
+        ic = self.main_window.instrument_controller
+        if ic is None:
+            return []
+        if end_time is None:
+            t, rows = ic.get_rows(self.table_name, start_time=start_time)
+            return rows
+        if accepts_end_time(ic):
+            t, rows = ic.get_rows(
+                self.table_name, start_time=start_time, end_time=end_time
+            )
+            return rows
+        return self._spooled_rows(ic, start_time, end_time)
+
+    def _spooled_rows(self, ic, start_time, end_time):
+        """Rows from [start_time, end_time), when get_rows has no end time
+
+        Each query returns everything up to now, so the rows for a few pages
+        either side of the request are kept and the following requests
+        (e.g. while scrolling) are answered from them.
+        """
+        spool = self._spool
+        if (
+            spool is not None
+            and spool[0] is ic
+            and spool[1] <= start_time
+            and end_time <= spool[2]
+        ):
+            rows = spool[3]
+        else:
+            width = (end_time - start_time) * spool_pages
+            lo = start_time - width
+            t, rows = ic.get_rows(self.table_name, start_time=lo)
+            # everything up to the newest row is known
+            hi = max([itm["Datetime"] for itm in rows], default=lo)
+            hi = min(hi, end_time + width)
+            kept = [itm for itm in rows if itm["Datetime"] < hi]
+            if len(kept) <= 4 * spool_pages * self.model.page_rows:
+                self._spool = (ic, lo, hi, kept)
+            else:
+                self._spool = None
+        return [itm for itm in rows if start_time <= itm["Datetime"] < end_time]
+
+    def on_table_scrolled(self, value):
+        sb = self.pastDataTableView.verticalScrollBar()
+        if value == sb.minimum() and sb.maximum() > sb.minimum():
+            self.model.fetch_older()
+
+    def on_history_loaded(self, nrows):
+        # keep the rows which were on-screen in the same place, otherwise the
+        # table would stay scrolled to the top and load the next page
+        self.pastDataTableView.scrollTo(
+            self.model.index(nrows, 0), QtWidgets.QAbstractItemView.PositionAtTop
+        )
+        self.flag_new_plot_data = True
+
     def plot(self, x, y, legend_data=None, title=None):
         if self.legend is not None:
             self.graph_widget.removeItem(self.legend)
@@ -257,88 +673,90 @@ class DataViewForm(QtWidgets.QWidget, Ui_DataViewForm):
             self.plot_series.append(p)
         self.graph_widget.setTitle(title)
 
-    def step_plot(self, x, y, legend_data=None, title=None):
-        x_all = x
-        y_all = y
-        smooth_these = ["LLD", "ULD", "ExFlow"]
-        do_smoothing = title in smooth_these
+    def reset_step_plot(self, yname):
+        """Start again, plotting column 'yname' as steps"""
+        for itm in self.plot_series:
+            self.graph_widget.removeItem(itm)
+        self.plot_series = []
+        for curves in self.step_curves.values():
+            self._remove_step_curves(curves)
+        self.step_curves = {}
         if self.legend is not None:
             self.graph_widget.removeItem(self.legend)
-        # if do_smoothing:
-        #    rc = 2
-        # else:
-        #    rc = 1
         self.legend = self.graph_widget.addLegend(frame=False, colCount=1)
 
-        for itm in self.plot_series:
-            self.graph_widget.removeItem(itm)
-            self.plot_series = []
-
-        dark_mode = self.main_window._use_dark_theme
-
-        # WARNING - MAGIC NUMBERS (assumes 10-sec)
-        # sampling interval, TODO: fix
-        conv_width = 6 * 30 // 2
-
-        data_is_not_numeric = False
-        for idx, (x, y, label) in enumerate(groupby_series(x_all, y_all, legend_data)):
-            dx = np.median(np.diff(x))
-            xplt = np.empty(len(x) * 2)
-            # end each bar at 'x', start at 'x-dx'
-            xplt[::2] = x - dx
-            xplt[1::2] = x
-            yplt = np.empty(len(y) * 2)
-            try:
-                yplt[::2] = y
-                yplt[1::2] = y
-            except ValueError:
-                data_is_not_numeric = True
-                break
-            color = self.get_color(idx)
-            if do_smoothing:
-                # blend the color into the background
-                if dark_mode:
-                    color = color[0] // 2, color[1] // 2, color[2] // 2
-                else:
-                    color = (
-                        (color[0] + 255) // 2,
-                        (color[1] + 255) // 2,
-                        (color[2] + 255) // 2,
-                    )
-            pen = pg.mkPen(color)
-            p = self.graph_widget.plot(xplt, yplt, name=label, pen=pen)
-            self.plot_series.append(p)
-
-        if do_smoothing:
-            # loop again, so that smooth lines are plotted on top
-            # of the earlier series
-            for idx, (x, y, label) in enumerate(
-                groupby_series(x_all, y_all, legend_data)
-            ):
-                # also add smoothed value for some inputs
-                dx = np.r_[np.median(np.diff(x)), np.diff(x)]
-                xplt = np.empty(len(x) * 2)
-                xplt[::2] = x - dx
-                xplt[1::2] = x
-                # 30 minutes smoothing
-                # only plot the smoothed version if there is enough data
-                if len(y) > conv_width * 3:
-                    conv = np.ones(conv_width + 1, dtype=float)
-                    conv /= conv.sum()
-                    y_s = np.convolve(conv, np.array(y).astype(float), mode="same")
-                    y_s[: conv_width // 2] = np.NaN
-                    y_s[-conv_width // 2 :] = np.NaN
-                    yplt = np.empty(len(y) * 2)
-                    yplt[::2] = y_s
-                    yplt[1::2] = y_s
-                    pen = pg.mkPen(self.get_color(idx))
-                    pen.setWidth(3)
-                    p = self.graph_widget.plot(
-                        xplt, yplt, name=label + " smoothed", pen=pen
-                    )
-                    self.plot_series.append(p)
-
-        self.graph_widget.setTitle(title)
+        smooth_these = ["LLD", "ULD", "ExFlow"]
+        # running mean over 15 minutes, the number of samples this takes
+        # depends on the sampling interval of each detector
+        smooth_time = 15 * 60 if yname in smooth_these else None
+        # the step arrays (and running means) are extended as rows arrive,
+        # one series per detector
+        self.step_series = SeriesBuffers(
+            [yname], factory=functools.partial(StepSeries, yname, smooth_time)
+        )
+        self.step_colors = {}
+        self.step_plot_dark_mode = self.main_window._use_dark_theme
+        self.graph_widget.setTitle(yname)
+
+    def _add_step_curves(self, label, smooth_time):
+        """Curves for one detector: [steps, running mean, generation drawn]"""
+        plot_item = self.graph_widget.getPlotItem()
+        idx = self.step_colors.setdefault(label, len(self.step_colors))
+        color = self.get_color(idx)
+        smooth_curve = None
+        if smooth_time is not None:
+            pen = pg.mkPen(self.get_color(idx))
+            pen.setWidth(3)
+            name = "smoothed" if label is None else label + " smoothed"
+            # the running mean near each end of the series changes as
+            # data arrive, so the decimation there is always redone
+            smooth_curve = DecimatedCurve(
+                plot_item, margin=smooth_time, name=name, pen=pen
+            )
+            # smooth lines are drawn on top of all the other series
+            smooth_curve.setZValue(1)
+            # blend the color into the background
+            if self.step_plot_dark_mode:
+                color = color[0] // 2, color[1] // 2, color[2] // 2
+            else:
+                color = (
+                    (color[0] + 255) // 2,
+                    (color[1] + 255) // 2,
+                    (color[2] + 255) // 2,
+                )
+        curve = DecimatedCurve(plot_item, name=label, pen=pg.mkPen(color))
+        return [curve, smooth_curve, None]
+
+    def _remove_step_curves(self, curves):
+        for itm in curves[:2]:
+            if itm is not None:
+                itm.remove()
+
+    def update_step_plot(self):
+        """Bring the step plot up to date with the model"""
+        try:
+            rebuilt = self.step_series.update(self.model.store)
+        except (ValueError, TypeError):
+            # data is not numeric, leave the plot empty
+            return
+        labels = self.step_series.labels()
+        for label in list(self.step_curves):
+            if label not in labels:
+                self._remove_step_curves(self.step_curves.pop(label))
+        for label in labels:
+            series = self.step_series.series[label]
+            if label not in self.step_curves:
+                self.step_curves[label] = self._add_step_curves(
+                    label, series.smooth_time
+                )
+            curves = self.step_curves[label]
+            curve, smooth_curve, generation = curves
+            changed = rebuilt or generation != series.generation
+            curves[2] = series.generation
+            # the curves are given views of the step arrays, not copies
+            curve.setData(*series.step_data(), rebuilt=changed)
+            if smooth_curve is not None:
+                smooth_curve.setData(*series.smoothed_step_data(), rebuilt=changed)
 
     def autoScroll(self):
         """
@@ -347,7 +765,70 @@ class DataViewForm(QtWidgets.QWidget, Ui_DataViewForm):
         """
         QtCore.QTimer.singleShot(0, self.pastDataTableView.scrollToBottom)
 
-    def update_displays(self):
+    def subscribe(self):
+        """Receive new rows for this table from the main window's TableHub"""
+        if self.table_name == "Results":
+            # only retrieve data from the last week
+            history = datetime.timedelta(days=7)
+        else:
+            history = datetime.timedelta(days=1)
+        # start paused, nothing is fetched until the tab is first shown
+        sub = self.main_window.table_hub.subscribe(
+            self.table_name, self.on_new_rows, history=history, paused=True
+        )
+        self.subscription = sub
+        # stop receiving data when this widget is deleted
+        self.destroyed.connect(lambda: sub.unsubscribe())
+
+    def showEvent(self, event):
+        super(DataViewForm, self).showEvent(event)
+        self._shown_time = time.perf_counter()
+        self.subscription.resume(on_caught_up=self.on_caught_up)
+
+    def hideEvent(self, event):
+        super(DataViewForm, self).hideEvent(event)
+        # hidden tabs don't poll the database, or update their model
+        self.subscription.pause()
+
+    def on_caught_up(self, nrows, fetch_time):
+        """Called once the rows which arrived while hidden have been loaded"""
+        # redraw straight away, rather than waiting for the scheduler
+        self.last_redraw_time = 0
+        self.update_displays()
+        dt = time.perf_counter() - self._shown_time
+        _logger.debug(
+            f"{self.table_name} tab up to date {dt*1000:.0f} ms after being shown "
+            f"({nrows} rows, fetched in {fetch_time*1000:.0f} ms)"
+        )
+
+    def on_new_rows(self, newdata):
+        first_run = not self.have_data
+        self.have_data = True
+        self.flag_new_plot_data = True
+
+        sb = self.pastDataTableView.verticalScrollBar()
+        scroll_bar_at_bottom = sb.value() >= sb.maximum()
+        self.model.append_data(newdata)
+        if scroll_bar_at_bottom or first_run:
+            self.autoScroll()
+
+        # this is disabled because sometimes RDM produces a table without any data
+        # in it, which crashes the program.  We shall re-enable when we get this working
+        # (needs a check for empty data tables)
+        if first_run and False:
+            # set the first column in the table (the Datetime column) to resize to fit its data
+            header = self.pastDataTableView.horizontalHeader()
+            try:
+                header.setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeToContents)
+            except Exception as ex:
+                import traceback
+                traceback.print_exc()
+
+        if first_run:
+            # draw the plot straight away, rather than waiting for the timer
+            self.update_displays(first_run=True)
+
+    def update_displays(self, first_run=False):
         dt_threshold = 0.95
         ic = self.main_window.instrument_controller
         # return if not connected or if the last redraw *completed* less than
@@ -355,51 +836,6 @@ class DataViewForm(QtWidgets.QWidget, Ui_DataViewForm):
         if ic is None or (time.time() - self.last_redraw_time) < dt_threshold:
             return
 
-        first_run = self.last_update_time is None
-
-        if self.last_update_time is None:
-            if self.table_name == "Results":
-                # only retrieve data from the last week
-                start_time = datetime.datetime.now(
-                    datetime.timezone.utc
-                ) - datetime.timedelta(days=7)
-            else:
-                start_time = datetime.datetime.now(
-                    datetime.timezone.utc
-                ) - datetime.timedelta(days=1)
-        else:
-            start_time = self.last_update_time
-        t, newdata = ic.get_rows(self.table_name, start_time=start_time)
-        if len(newdata) > 0:
-            self.flag_new_plot_data = True
-
-        if t is not None:
-            self.last_update_time = t
-            # use the database rowid as the reference, rather than taking the
-            # time into account (this handles multipe detectors where one might
-            # stop updating for a while)
-            self.last_update_time.t = None
-            sb = self.pastDataTableView.verticalScrollBar()
-            scroll_bar_at_bottom = sb.value() >= sb.maximum()
-            self.model.append_data(newdata)
-            if scroll_bar_at_bottom or first_run:
-                self.autoScroll()
-            
-            # this is disabled because sometimes RDM produces a table without any data
-            # in it, which crashes the program.  We shall re-enable when we get this working
-            # (needs a check for empty data tables)
-            if first_run and False:
-                # set the first column in the table (the Datetime column) to resize to fit its data
-                header = self.pastDataTableView.horizontalHeader()
-                try:
-                    header.setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeToContents)
-                except Exception as ex:
-                    import traceback
-                    traceback.print_exc()
-
-
-        # TODO: link to plot data, or somehow avoid copying the entire
-        # x/y series each time
         redraw_plot = False
         redraw_plot = (
             (self.graph_widget is not None)
@@ -416,15 +852,13 @@ class DataViewForm(QtWidgets.QWidget, Ui_DataViewForm):
         #    print("***", self.graph_widget, redraw_plot, self.graph_widget.isVisible())
 
         if redraw_plot:
-            # find DetectorName column
-            yname, y = self.model.get_plot_data(column_idx=self.selected_column)
-            xname, x = self.model.get_plot_data(column_idx=0)
-            detector_name = self.model.get_detector_name_data()
-            # pyqtgraph timestamps are assumed to be in non-daylight saving time
-            # Here, I'm subtracting the timezone offset (in seconds) so that
-            # the plotted value is in UTC
-            x = [itm.timestamp() + time.timezone for itm in x]
-            self.step_plot(x, y, legend_data=detector_name, title=yname)
+            if (
+                self.selected_column != self.previous_selected_column
+                or self.step_plot_dark_mode != self.main_window._use_dark_theme
+            ):
+                yname, y = self.model.get_plot_data(column_idx=self.selected_column)
+                self.reset_step_plot(yname)
+            self.update_step_plot()
             self.flag_new_plot_data = False
             self.previous_selected_column = self.selected_column
 
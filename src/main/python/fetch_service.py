@@ -0,0 +1,78 @@
+import logging
+import traceback
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from PyQt5 import QtCore
+
+_logger = logging.getLogger(__name__)
+
+
+class _Task(QtCore.QRunnable):
+    def __init__(self, service: "FetchService", key, fn):
+        super(_Task, self).__init__()
+        self.service = service
+        self.key = key
+        self.fn = fn
+
+    def run(self):
+        try:
+            result = self.fn()
+        except Exception as ex:
+            _logger.error(f"Error while fetching {self.key}: {traceback.format_exc()}")
+            self.service._finished.emit(self.key, None, ex)
+            return
+        self.service._finished.emit(self.key, result, None)
+
+
+class FetchService(QtCore.QObject):
+    """Run slow calls (e.g. instrument_controller.get_rows) in a background thread
+
+    Each request has a key (e.g. the table name) and only one request per
+    key can be in flight at a time - a new request for a busy key is
+    ignored.  Results are delivered to the callback in the GUI thread,
+    via a queued signal.
+
+    The instrument controller is not known to be thread-safe, so by default
+    there is a single worker thread and the calls are made one at a time.
+    Waiting requests run in order of priority, so a long job can be split
+    into low priority requests which don't hold up the regular polling.
+    """
+
+    # key, result, exception
+    _finished = QtCore.pyqtSignal(object, object, object)
+
+    def __init__(self, parent=None, max_threads=1):
+        super(FetchService, self).__init__(parent)
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(max_threads)
+        self._in_flight: Dict[
+            Hashable, Tuple[Optional[Callable], Optional[Callable]]
+        ] = {}
+        self._finished.connect(self._on_finished)
+
+    def request(self, key, fn, callback=None, error_callback=None, priority=0) -> bool:
+        """Call fn() in the background, then callback(result) in the GUI thread
+
+        Returns False (and does nothing) if a request with the same key is
+        already running.
+        """
+        if key in self._in_flight:
+            return False
+        self._in_flight[key] = (callback, error_callback)
+        self._pool.start(_Task(self, key, fn), priority)
+        return True
+
+    def _on_finished(self, key, result, error):
+        callback, error_callback = self._in_flight.pop(key, (None, None))
+        try:
+            if error is not None:
+                if error_callback is not None:
+                    error_callback(error)
+            elif callback is not None:
+                callback(result)
+        except Exception:
+            _logger.error(f"Error handling result of {key}: {traceback.format_exc()}")
+
+    def wait(self, msecs=-1) -> bool:
+        """Wait for running requests to finish, e.g. before shutting down"""
+        return self._pool.waitForDone(msecs)
@@ -0,0 +1,146 @@
+import logging
+import time
+import traceback
+from typing import Callable, List, Optional
+
+import sip
+from PyQt5 import QtCore, QtWidgets
+
+_logger = logging.getLogger(__name__)
+
+
+class ScheduledTask(object):
+    """A periodic task, as registered with GuiScheduler"""
+
+    def __init__(
+        self, name, callback, interval, priority, widget, run_immediately=False
+    ):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.priority = priority
+        self.widget = widget
+        # first run is after one interval, or on the next tick
+        self.next_due = time.monotonic() + (0.0 if run_immediately else interval)
+        # timing statistics
+        self.count = 0
+        self.skipped = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_time = 0.0
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.count if self.count > 0 else 0.0
+
+
+class GuiScheduler(QtCore.QObject):
+    """A single timer which runs all of the periodic GUI updates
+
+    Tasks are registered with an interval (seconds) and a priority.  On
+    each tick, the tasks which are due run in order of priority (highest
+    first).  A task can be tied to a widget, in which case it is skipped
+    while the widget is hidden.  The time taken by each task is recorded,
+    see `stats`.
+    """
+
+    # tasks which take longer than this (seconds) are logged
+    slow_task_threshold = 0.1
+
+    def __init__(self, parent=None, tick_ms=250):
+        super(GuiScheduler, self).__init__(parent)
+        self._tasks: List[ScheduledTask] = []
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(tick_ms)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def register(
+        self,
+        name: str,
+        callback: Callable[[], None],
+        interval: float,
+        priority: int = 0,
+        widget: Optional[QtWidgets.QWidget] = None,
+        run_immediately: bool = False,
+    ) -> ScheduledTask:
+        """Run callback() every 'interval' seconds
+
+        The first run is 'interval' seconds from now, or on the next tick if
+        run_immediately is True.  If widget is given, the task only runs when
+        the widget is visible and is removed automatically when the widget is
+        deleted.
+        """
+        task = ScheduledTask(
+            name, callback, interval, priority, widget, run_immediately
+        )
+        self._tasks.append(task)
+        # keep the list in the order tasks should run in
+        self._tasks.sort(key=lambda x: -x.priority)
+        if widget is not None:
+            widget.destroyed.connect(lambda: self.unregister(task))
+        return task
+
+    def unregister(self, task: ScheduledTask):
+        if task in self._tasks:
+            self._tasks.remove(task)
+
+    def _tick(self):
+        now = time.monotonic()
+        # copy the list, because tasks might register/unregister others
+        for task in list(self._tasks):
+            if task.next_due > now:
+                continue
+            # stay in phase, unless we've fallen behind
+            task.next_due += task.interval
+            if task.next_due <= now:
+                task.next_due = now + task.interval
+            widget = task.widget
+            if widget is not None:
+                if sip.isdeleted(widget):
+                    self.unregister(task)
+                    continue
+                if not widget.isVisible():
+                    task.skipped += 1
+                    continue
+            tick = time.perf_counter()
+            try:
+                task.callback()
+            except Exception:
+                _logger.error(
+                    f"Error in scheduled task {task.name}: {traceback.format_exc()}"
+                )
+            dt = time.perf_counter() - tick
+            task.count += 1
+            task.total_time += dt
+            task.last_time = dt
+            task.max_time = max(task.max_time, dt)
+            if dt > self.slow_task_threshold:
+                _logger.debug(f"Scheduled task {task.name} took {dt*1000:.0f} ms")
+
+    def stats(self):
+        """Timing statistics for each task (times are in ms)"""
+        return [
+            {
+                "name": itm.name,
+                "runs": itm.count,
+                "skipped": itm.skipped,
+                "mean_ms": itm.mean_time * 1000,
+                "max_ms": itm.max_time * 1000,
+                "last_ms": itm.last_time * 1000,
+            }
+            for itm in self._tasks
+        ]
+
+    def log_stats(self):
+        lines = [
+            f"{itm['name']}: {itm['runs']} runs ({itm['skipped']} skipped), "
+            f"mean {itm['mean_ms']:.1f} ms, max {itm['max_ms']:.1f} ms"
+            for itm in self.stats()
+        ]
+        _logger.debug("GUI task timings:\n  " + "\n  ".join(lines))
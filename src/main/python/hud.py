@@ -0,0 +1,142 @@
+import logging
+from typing import Dict, List, Tuple
+
+from PyQt5 import QtCore, QtWidgets
+
+_logger = logging.getLogger(__name__)
+
+# (table, column, label, format) for the first lines of the HUD.  Any other
+# columns are shown below these, in the order they are first seen
+hud_fields = [
+    ("Results", "ApproxRadon", "Rn", "{:.1f} Bq/m³"),
+    ("Results", "Datetime", "Last 30-min", "{:%Y-%m-%d %H:%M}"),
+    ("RTV", "LLD", "Counts", "{:.0f}"),
+    ("RTV", "ULD", "Noise", "{:.0f}"),
+    ("RTV", "ExFlow", "Ext. flow", "{:.1f} l/min"),
+    ("RTV", "HV", "PMT", "{:.0f} V"),
+    ("RTV", "Datetime", "Updated", "{:%H:%M:%S}"),
+]
+
+# columns which are never shown
+hud_hidden_columns = {"DetectorName"}
+
+
+def default_format(value):
+    """Format for a column which isn't in hud_fields"""
+    if isinstance(value, float):
+        return "{:.4g}"
+    return "{}"
+
+
+def format_value(fmt, value):
+    if value is None:
+        return "-"
+    try:
+        return fmt.format(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class HudWidget(QtWidgets.QFrame):
+    """Current measurements, one column per detector
+
+    Fed with the most recent row from each detector (see
+    `MainWindow.data_update`).  Each value is a separate label, and a label
+    is only touched when its text changes, so a new row which repeats the
+    last one costs (almost) nothing.  A line is added for each column of the
+    data, not just the ones in `hud_fields`.
+    """
+
+    def __init__(self, parent=None):
+        super(HudWidget, self).__init__(parent)
+        self._layout = QtWidgets.QGridLayout(self)
+        self._layout.setHorizontalSpacing(16)
+        self._layout.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+        # (table, column, label, format) for each line
+        self._fields: List[Tuple[str, str, str, str]] = []
+        # (table, column) -> line number
+        self._field_index: Dict[Tuple[str, str], int] = {}
+        self._detectors: List[str] = []
+        self._headers: Dict[str, QtWidgets.QLabel] = {}
+        # detector name -> one label per field
+        self._labels: Dict[str, List[QtWidgets.QLabel]] = {}
+        # the text last shown by each label
+        self._text: Dict[str, List[str]] = {}
+        for field in hud_fields:
+            self._add_field(*field)
+
+    def _value_label(self, line, col):
+        label = QtWidgets.QLabel("-")
+        label.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
+        self._layout.addWidget(label, line + 1, col)
+        return label
+
+    def _add_field(self, table, column, label, fmt):
+        line = len(self._fields)
+        self._fields.append((table, column, label, fmt))
+        self._field_index[(table, column)] = line
+        self._layout.addWidget(QtWidgets.QLabel(label), line + 1, 0)
+        for col, name in enumerate(self._detectors, 1):
+            self._labels[name].append(self._value_label(line, col))
+            self._text[name].append("-")
+
+    def _add_columns(self, table_name, row):
+        """Add a line for each column of 'row' which isn't shown yet"""
+        labels = {itm[2] for itm in self._fields}
+        for column, value in row.items():
+            if (
+                column in hud_hidden_columns
+                or (table_name, column) in self._field_index
+            ):
+                continue
+            # the tables share some column names
+            label = column if column not in labels else f"{column} ({table_name})"
+            self._add_field(table_name, column, label, default_format(value))
+            labels.add(label)
+
+    def _add_detector(self, name):
+        col = len(self._detectors) + 1
+        header = QtWidgets.QLabel(f"<b>{name}</b>")
+        self._layout.addWidget(header, 0, col)
+        self._detectors.append(name)
+        self._headers[name] = header
+        self._labels[name] = [
+            self._value_label(line, col) for line in range(len(self._fields))
+        ]
+        self._text[name] = ["-"] * len(self._fields)
+
+    def on_data(self, table_name, row):
+        """Show the values from a new row"""
+        name = row.get("DetectorName")
+        if name not in self._labels:
+            self._add_detector(name)
+        if any(
+            (table_name, k) not in self._field_index and k not in hud_hidden_columns
+            for k in row
+        ):
+            self._add_columns(table_name, row)
+        labels = self._labels[name]
+        text = self._text[name]
+        for column, value in row.items():
+            ii = self._field_index.get((table_name, column))
+            if ii is None:
+                continue
+            s = format_value(self._fields[ii][3], value)
+            if s != text[ii]:
+                text[ii] = s
+                labels[ii].setText(s)
+
+    def clear(self):
+        """Remove all of the detectors"""
+        if len(self._detectors) == 0:
+            return
+        for name in self._detectors:
+            self._layout.removeWidget(self._headers[name])
+            self._headers[name].deleteLater()
+            for label in self._labels[name]:
+                self._layout.removeWidget(label)
+                label.deleteLater()
+        self._detectors = []
+        self._headers = {}
+        self._labels = {}
+        self._text = {}
@@ -0,0 +1,74 @@
+import collections
+import itertools
+import logging
+
+import sip
+from PyQt5 import QtWidgets
+
+_logger = logging.getLogger(__name__)
+
+
+class LogSink(logging.Handler):
+    """Show log messages, from any thread, in a QPlainTextEdit
+
+    `emit` only formats the record and appends it to a queue, so logging
+    from a busy thread doesn't flood the GUI event loop.  `show_pending`
+    (run periodically by the GuiScheduler) moves the queued messages into
+    the widget with a single append.
+
+    The queue holds at most 'max_pending' messages and at most
+    'max_per_update' are shown at a time.  The rest are dropped, and
+    replaced by a marker saying how many messages were suppressed (they
+    still go to the log file).  The widget keeps 'max_blocks' lines.
+    """
+
+    def __init__(
+        self,
+        widget: QtWidgets.QPlainTextEdit,
+        max_pending=10000,
+        max_per_update=500,
+        max_blocks=10000,
+    ):
+        super().__init__()
+        self.widget = widget
+        self.widget.setReadOnly(True)
+        self.widget.setMaximumBlockCount(max_blocks)
+        self.max_per_update = max_per_update
+        # (sequence number, message). Both next() on the counter and
+        # deque.append are atomic, so no lock is needed, and the deque
+        # silently drops the oldest messages when it is full
+        self._pending = collections.deque(maxlen=max_pending)
+        self._counter = itertools.count()
+        # sequence number of the next message expected by show_pending
+        self._next_seq = 0
+        self.suppressed = 0
+
+    def emit(self, record):
+        try:
+            msg = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self._pending.append((next(self._counter), msg))
+
+    def show_pending(self):
+        """Move queued messages into the widget (call from the GUI thread)"""
+        if len(self._pending) == 0 or sip.isdeleted(self.widget):
+            return
+        batch = []
+        pending = self._pending
+        while len(pending) > 0:
+            batch.append(pending.popleft())
+        # messages which fell off the front of the queue (approximately,
+        # a message from another thread can be appended slightly out of order)
+        seq_end = max(seq for seq, msg in batch) + 1
+        dropped = max(0, seq_end - self._next_seq - len(batch))
+        self._next_seq = max(self._next_seq, seq_end)
+        if len(batch) > self.max_per_update:
+            dropped += len(batch) - self.max_per_update
+            batch = batch[-self.max_per_update :]
+        lines = [msg for seq, msg in batch]
+        if dropped > 0:
+            self.suppressed += dropped
+            lines.insert(0, f"[... {dropped} log messages suppressed ...]")
+        self.widget.appendPlainText("\n".join(lines))
@@ -0,0 +1,450 @@
+import array
+import datetime
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+import traceback
+from typing import Optional
+
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+_logger = logging.getLogger(__name__)
+
+# The level is the first thing on the line in the GUI format ("[D 2021-...")
+# and is near the start of the line in most other formats
+_LEVEL_RE = re.compile(
+    rb"^(?:\[([DIWEC]) |[^\n]{0,60}?\b(DEBUG|INFO|WARNING|ERROR|CRITICAL)\b)", re.M
+)
+_TIME_RE = re.compile(rb"(\d{4})-(\d\d)-(\d\d)[ T](\d\d):(\d\d):(\d\d)")
+# levels are stored as logging level // 10, with 0 meaning unknown
+_LEVEL_CODES = {
+    b"D": 1,
+    b"I": 2,
+    b"W": 3,
+    b"E": 4,
+    b"C": 5,
+    b"DEBUG": 1,
+    b"INFO": 2,
+    b"WARNING": 3,
+    b"ERROR": 4,
+    b"CRITICAL": 5,
+}
+# this much of the start of the file is kept, to tell if it has been replaced
+_HEAD_BYTES = 256
+
+
+class LogIndex(object):
+    """Where each line of a log file starts, and its level
+
+    The file is memory-mapped, so building the index and reading lines
+    doesn't load the file into memory.  Lines without a level (e.g. a
+    traceback) take the level of the line before.  An index is not
+    modified once built, `build_log_index` makes a new one when the file
+    grows.
+    """
+
+    def __init__(self, path, mm, size, starts, levels, file_id=None, head=b""):
+        self.path = path
+        self.mm: Optional[mmap.mmap] = mm
+        # number of bytes indexed, up to the end of the last complete line
+        self.size = size
+        self.starts: np.ndarray = starts
+        self.levels: np.ndarray = levels
+        # (device, inode) and the first few bytes of the file, which are
+        # checked before carrying on from this index
+        self.file_id = file_id
+        self.head = head
+
+    def same_file(self, file_id, mm) -> bool:
+        """True if 'mm' looks like the file which was indexed"""
+        return file_id == self.file_id and mm[: len(self.head)] == self.head
+
+    def __len__(self):
+        return len(self.starts)
+
+    def close(self):
+        """Unmap the file, after which the index can't be used"""
+        if self.mm is None:
+            return
+        try:
+            self.mm.close()
+        except BufferError:
+            # a search is still running, the map is closed when it's
+            # garbage collected instead
+            return
+        self.mm = None
+
+    def _line_bytes(self, idx, maxlen=None):
+        i0 = self.starts[idx]
+        i1 = self.starts[idx + 1] - 1 if idx + 1 < len(self.starts) else self.size - 1
+        if maxlen is not None:
+            i1 = min(i1, i0 + maxlen)
+        return self.mm[i0:i1]
+
+    def text(self, idx) -> str:
+        return self._line_bytes(idx).decode("utf-8", "replace").rstrip("\r")
+
+    def line_time(self, idx) -> Optional[datetime.datetime]:
+        """Timestamp at the start of line 'idx', or None if there isn't one"""
+        m = _TIME_RE.search(self._line_bytes(idx, maxlen=100))
+        if m is None:
+            return None
+        try:
+            return datetime.datetime(*[int(itm) for itm in m.groups()])
+        except ValueError:
+            return None
+
+    def _time_before(self, idx) -> Optional[datetime.datetime]:
+        """Timestamp of line 'idx' or, failing that, of a line shortly before"""
+        for ii in range(idx, max(-1, idx - 200), -1):
+            t = self.line_time(ii)
+            if t is not None:
+                return t
+        return None
+
+    def find_time(self, t: datetime.datetime, lines: np.ndarray) -> int:
+        """Position in 'lines' (line numbers, in order) of the first line at or after 't'
+
+        This is a binary search, so only a few lines are read.
+        """
+        lo = 0
+        hi = len(lines)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            t_mid = self._time_before(int(lines[mid]))
+            if t_mid is None or t_mid < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def search(self, text: str) -> np.ndarray:
+        """Numbers of the lines containing 'text' (ignoring case)"""
+        pattern = re.compile(re.escape(text.encode("utf-8")), re.IGNORECASE)
+        offsets = array.array("q")
+        last_line_end = -1
+        for m in pattern.finditer(self.mm, 0, self.size):
+            if m.start() < last_line_end:
+                # already have this line
+                continue
+            offsets.append(m.start())
+            last_line_end = self.mm.find(b"\n", m.start(), self.size)
+        offsets = np.frombuffer(offsets, dtype=np.int64)
+        return np.searchsorted(self.starts, offsets, side="right") - 1
+
+
+def build_log_index(path, previous: Optional[LogIndex] = None) -> LogIndex:
+    """Index a log file, carrying on from 'previous' if the file has grown
+
+    This reads the whole file (in chunks) the first time, so it's meant to
+    run in a background thread.  The new index has its own memory map, and
+    'previous' is left open (close it once it is no longer in use).
+    """
+    empty = LogIndex(path, None, 0, np.zeros(0, np.int64), np.zeros(0, np.int8))
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        file_size = st.st_size
+        if file_size == 0:
+            return empty
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    file_id = (st.st_dev, st.st_ino)
+    if (
+        previous is None
+        or previous.size > file_size
+        or not previous.same_file(file_id, mm)
+    ):
+        # new, or replaced (e.g. rotated), file
+        previous = empty
+    head = mm[:_HEAD_BYTES]
+    start = previous.size
+
+    # line ends, found in chunks to limit the size of temporary arrays
+    chunk_size = 16 * 2**20
+    buf = np.frombuffer(mm, dtype=np.uint8)
+    newlines = [np.zeros(0, np.int64)]
+    for i0 in range(start, file_size, chunk_size):
+        newlines.append(np.flatnonzero(buf[i0 : i0 + chunk_size] == 10) + i0)
+    del buf
+    newlines = np.concatenate(newlines)
+    if len(newlines) == 0:
+        return LogIndex(
+            path, mm, previous.size, previous.starts, previous.levels, file_id, head
+        )
+    end = int(newlines[-1]) + 1
+    starts = np.r_[start, newlines[:-1] + 1]
+
+    # level of each line
+    offsets = array.array("q")
+    codes = array.array("b")
+    for m in _LEVEL_RE.finditer(mm, start, end):
+        offsets.append(m.start())
+        codes.append(_LEVEL_CODES[m.group(1) or m.group(2)])
+    levels = np.zeros(len(starts), dtype=np.int8)
+    if len(previous) > 0:
+        levels[0] = previous.levels[-1]
+    line_idx = np.searchsorted(
+        starts, np.frombuffer(offsets, dtype=np.int64), side="right"
+    )
+    levels[line_idx - 1] = np.frombuffer(codes, dtype=np.int8)
+    # lines without a level take the level of the line before
+    known = np.where(levels > 0, np.arange(len(levels)), 0)
+    levels = levels[np.maximum.accumulate(known)]
+
+    return LogIndex(
+        path,
+        mm,
+        end,
+        np.concatenate([previous.starts, starts]),
+        np.concatenate([previous.levels, levels]),
+        file_id,
+        head,
+    )
+
+
+class LogModel(QtCore.QAbstractListModel):
+    """The lines of a LogIndex which pass the filters, read on demand"""
+
+    def __init__(self, parent=None):
+        super(LogModel, self).__init__(parent)
+        self.index_: Optional[LogIndex] = None
+        self.lines = np.zeros(0, dtype=np.int64)
+
+    def set_lines(self, index: LogIndex, lines: np.ndarray):
+        self.beginResetModel()
+        self.index_ = index
+        self.lines = lines
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.lines)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or self.index_ is None:
+            return None
+        line = int(self.lines[index.row()])
+        if role == QtCore.Qt.DisplayRole:
+            return self.index_.text(line)
+        if role == QtCore.Qt.ForegroundRole:
+            level = self.index_.levels[line]
+            if level >= 4:
+                return QtGui.QBrush(QtGui.QColor("red"))
+            if level == 3:
+                return QtGui.QBrush(QtGui.QColor("darkorange"))
+        return None
+
+
+class LogViewerDialog(QtWidgets.QDialog):
+    """Browse a (possibly very large) log file
+
+    Indexing and text searches run in a background thread.  Filtering by
+    level and jumping to a time use the index, so they are immediate.
+    """
+
+    # emitted from the background thread: generation, LogIndex
+    _index_ready = QtCore.pyqtSignal(object, object)
+    # generation, search text, line numbers
+    _search_ready = QtCore.pyqtSignal(object, object, object)
+
+    levels = [("All", 0), ("Debug", 1), ("Info", 2), ("Warning", 3), ("Error", 4)]
+
+    def __init__(self, path, parent=None):
+        super(LogViewerDialog, self).__init__(parent)
+        self.path = path
+        self.setWindowTitle(f"Log file - {path}")
+        self.resize(1000, 600)
+        self._log_index: Optional[LogIndex] = None
+        self._indexing = False
+        # used to ignore out-of-date results from the background thread
+        self._generation = 0
+        # the same, for indexing
+        self._index_generation = 0
+        # (text, lines) from the last search
+        self._search = None
+
+        self.levelComboBox = QtWidgets.QComboBox()
+        for name, code in self.levels:
+            self.levelComboBox.addItem(name, code)
+        self.filterLineEdit = QtWidgets.QLineEdit()
+        self.filterLineEdit.setPlaceholderText("Module, thread or text")
+        self.filterLineEdit.setClearButtonEnabled(True)
+        self.timeEdit = QtWidgets.QDateTimeEdit(QtCore.QDateTime.currentDateTime())
+        self.timeEdit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+        self.timeEdit.setCalendarPopup(True)
+        goButton = QtWidgets.QPushButton("Go to time")
+        reloadButton = QtWidgets.QPushButton("Reload")
+        controls = QtWidgets.QHBoxLayout()
+        controls.addWidget(QtWidgets.QLabel("Level"))
+        controls.addWidget(self.levelComboBox)
+        controls.addWidget(QtWidgets.QLabel("Filter"))
+        controls.addWidget(self.filterLineEdit, stretch=1)
+        controls.addWidget(self.timeEdit)
+        controls.addWidget(goButton)
+        controls.addWidget(reloadButton)
+
+        self.model = LogModel(self)
+        self.listView = QtWidgets.QListView()
+        self.listView.setModel(self.model)
+        # all rows are the same height, so only the visible ones are read
+        self.listView.setUniformItemSizes(True)
+        self.listView.setFont(
+            QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont)
+        )
+        self.listView.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.statusLabel = QtWidgets.QLabel("")
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(controls)
+        layout.addWidget(self.listView)
+        layout.addWidget(self.statusLabel)
+
+        # wait for a pause in typing before searching
+        self._filter_timer = QtCore.QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(300)
+        self._filter_timer.timeout.connect(self.apply_filters)
+
+        self._index_ready.connect(self._on_index_ready)
+        self._search_ready.connect(self._on_search_ready)
+        self.levelComboBox.currentIndexChanged.connect(self.apply_filters)
+        self.filterLineEdit.textChanged.connect(self._filter_timer.start)
+        goButton.clicked.connect(self.go_to_time)
+        reloadButton.clicked.connect(self.reload)
+        self.finished.connect(self.release_index)
+
+        self.reload()
+
+    def _run_in_background(self, fn, signal, generation, *args):
+        def run():
+            try:
+                result = fn()
+            except Exception:
+                _logger.error(f"Error reading {self.path}: {traceback.format_exc()}")
+                result = None
+            try:
+                signal.emit(generation, *args, result)
+            except RuntimeError:
+                # the dialog has been deleted
+                pass
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def reload(self):
+        """Re-index the log file, which carries on from the old index if the file grew"""
+        if self._indexing:
+            return
+        self._indexing = True
+        self._index_generation += 1
+        self.statusLabel.setText("Indexing...")
+        previous = self._log_index
+        path = self.path
+        self._t0 = time.perf_counter()
+        self._run_in_background(
+            lambda: build_log_index(path, previous),
+            self._index_ready,
+            self._index_generation,
+        )
+
+    def _on_index_ready(self, generation, log_index):
+        if generation != self._index_generation:
+            # the dialog was closed, and maybe re-opened, while indexing
+            if log_index is not None:
+                log_index.close()
+            return
+        self._indexing = False
+        if log_index is None:
+            self.statusLabel.setText(f"Unable to read {self.path}")
+            return
+        if not self.isVisible():
+            # hidden while indexing
+            log_index.close()
+            return
+        _logger.debug(
+            f"Indexed {len(log_index)} lines of {self.path} "
+            f"in {time.perf_counter() - self._t0:.2f} s"
+        )
+        at_end = self._at_end()
+        previous = self._log_index
+        self._log_index = log_index
+        # searches need to be re-run on the new index
+        self._search = None
+        self.apply_filters()
+        self._close_if_unused(previous)
+        if at_end:
+            self.listView.scrollToBottom()
+
+    def _close_if_unused(self, log_index: Optional[LogIndex]):
+        """Close an old index, unless the model is still showing it"""
+        if log_index is None or log_index is self._log_index:
+            return
+        if log_index is not self.model.index_:
+            log_index.close()
+
+    def _set_lines(self, log_index: Optional[LogIndex], lines: np.ndarray):
+        previous = self.model.index_
+        self.model.set_lines(log_index, lines)
+        self._close_if_unused(previous)
+
+    def release_index(self):
+        """Close the memory-mapped log file (e.g. when the dialog is closed)
+
+        The file is indexed again by the next `reload`.
+        """
+        self._generation += 1
+        self._search = None
+        # any indexing which is still running is out of date
+        self._index_generation += 1
+        self._indexing = False
+        log_index = self._log_index
+        self._log_index = None
+        self._set_lines(None, np.zeros(0, dtype=np.int64))
+        self._close_if_unused(log_index)
+
+    def _at_end(self):
+        scrollbar = self.listView.verticalScrollBar()
+        return scrollbar.value() == scrollbar.maximum()
+
+    def apply_filters(self):
+        log_index = self._log_index
+        if log_index is None:
+            return
+        text = self.filterLineEdit.text()
+        if text and (self._search is None or self._search[0] != text):
+            # search in the background, then come back here
+            self._generation += 1
+            self.statusLabel.setText(f"Searching for '{text}'...")
+            self._run_in_background(
+                lambda: log_index.search(text),
+                self._search_ready,
+                self._generation,
+                text,
+            )
+            return
+        min_level = self.levelComboBox.currentData()
+        lines = np.flatnonzero(log_index.levels >= min_level)
+        if text:
+            lines = np.intersect1d(lines, self._search[1], assume_unique=True)
+        self._set_lines(log_index, lines)
+        self.statusLabel.setText(f"{len(lines)} of {len(log_index)} lines")
+
+    def _on_search_ready(self, generation, text, lines):
+        if generation != self._generation or lines is None:
+            return
+        self._search = (text, lines)
+        self.apply_filters()
+
+    def go_to_time(self):
+        if self._log_index is None:
+            return
+        t = self.timeEdit.dateTime().toPyDateTime().replace(microsecond=0)
+        row = self._log_index.find_time(t, self.model.lines)
+        row = min(row, self.model.rowCount() - 1)
+        if row >= 0:
+            index = self.model.index(row)
+            self.listView.setCurrentIndex(index)
+            self.listView.scrollTo(index, QtWidgets.QAbstractItemView.PositionAtTop)
@@ -1,4 +1,8 @@
 print("started in main.py")
+import time
+
+t_start = time.perf_counter()
+
 import logging
 import sys
 
@@ -8,8 +12,11 @@ from fbs_runtime.application_context.PyQt5 import ApplicationContext
 from mainwindow import MainWindow
 # from PyQt5.QtWidgets import QMainWindow
 from PyQt5 import QtCore, QtWidgets, uic
+from startup_trace import trace as startup_trace
 
 setup_logging(loglevel=logging.DEBUG)
+startup_trace.start(t_start)
+startup_trace.mark("imports")
 
 
 if __name__ == "__main__":
@@ -20,9 +27,11 @@ if __name__ == "__main__":
 
     if lockfile.tryLock(100):
         appctxt = ApplicationContext()  # 1. Instantiate ApplicationContext
+        startup_trace.mark("ApplicationContext")
         window = MainWindow(appctxt)
         # window.resize(250, 150)
         window.show()
+        startup_trace.mark("show")
         exit_code = appctxt.app.exec_()  # 2. Invoke appctxt.app.exec_()
         sys.exit(exit_code)
     else:
@@ -1,6 +1,7 @@
 import collections
 import copy
 import datetime
+import functools
 import logging
 import math
 import os
@@ -13,19 +14,26 @@ from typing import Dict, List, Optional, Union
 import numpy as np
 import pyqtgraph as pg
 import sip
-from ansto_radon_monitor.configuration import (Configuration,
-                                               config_from_inifile)
+from aggregates import AggregatePyramid
+from ansto_radon_monitor.configuration import Configuration, config_from_inifile
 from ansto_radon_monitor.main import setup_logging
 from ansto_radon_monitor.main_controller import MainController, initialize
-from c_and_b import CAndBForm
-from data_plotter import DataPlotter
+from column_store import ColumnStore, estimate_row_nbytes
+from controller_loader import ControllerLoader
+from data_plotter import DataPlotter, load_plot_history, results_plot_columns
 from data_view import DataViewForm
 from fbs_runtime.application_context.PyQt5 import ApplicationContext
+from fetch_service import FetchService
+from gui_scheduler import GuiScheduler
+from hud import HudWidget
+from log_sink import LogSink
 from PyQt5 import QtCore, QtGui, QtWidgets, uic
+
 # from PyQt5.QtWidgets import QMainWindow
 from PyQt5.QtCore import QSettings, Qt, QTimer
-from sensitivity_sweep import SensitivitySweepForm
-from system_information import SystemInformationForm
+from startup_trace import trace as startup_trace
+from status_service import StatusService
+from table_hub import TableHub
 from timeout_dialog import TimeoutDialog
 from ui_mainwindow import Ui_MainWindow
 
@@ -46,21 +54,6 @@ from ui_mainwindow import Ui_MainWindow
 
 _logger = logging.getLogger(__name__)
 
-# small class for our 'log message' signal to live in
-class QTextEditLogger(logging.Handler, QtCore.QObject):
-    appendPlainText = QtCore.pyqtSignal(str)
-
-    def __init__(self, widget):
-        super().__init__()
-        QtCore.QObject.__init__(self)
-        self.widget = widget
-        self.widget.setReadOnly(True)
-        self.appendPlainText.connect(self.widget.appendPlainText)
-
-    def emit(self, record):
-        msg = self.format(record)
-        self.appendPlainText.emit(msg)
-
 
 class QTextEditLogger_non_threadsafe(logging.Handler):
     def __init__(self, widget):
@@ -121,6 +114,12 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         _logger.debug(f"QSettings initialised at {self.qsettings.fileName()}")
 
         self.setupUi(self)
+        startup_trace.mark("setupUi")
+        # current values are shown in labels, updated as data arrive, rather
+        # than as html in the hudTextBrowser from the .ui file
+        self.hud = HudWidget(self.verticalLayoutWidget)
+        self.verticalLayout.replaceWidget(self.hudTextBrowser, self.hud)
+        self.hudTextBrowser.hide()
         # plot default settings
         pg.setConfigOption("antialias", True)
 
@@ -136,6 +135,21 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
 
         self.instrument_controller: Optional[MainController] = None
         self.config: Optional[Configuration] = None
+        # for running instrument controller queries in the background
+        self.fetch_service = FetchService(self)
+        # shared cache of table data, polled once per second
+        self.table_hub = TableHub(
+            self.fetch_service, self, max_bytes=self.plot_memory_budget()
+        )
+        # cached instrument controller status, shared by the widgets
+        self.status_service = StatusService(self.fetch_service, parent=self)
+        self.status_service.summary_changed.connect(
+            lambda message: self.set_status(message, None)
+        )
+        # if the Calibration Unit is active then turn on a banner display
+        self.status_service.cal_unit_active_changed.connect(self.alertFrame.setVisible)
+        # runs the periodic display updates
+        self.scheduler = GuiScheduler(self)
         self.configured_tables: List[str] = []
 
         # multi-panel plot window
@@ -144,6 +158,12 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.data_plotter = None
         # cache of data for multi-panel plot
         self.plot_data = None
+        # summaries of older Results, for zooming out on the multi-panel plot
+        self.plot_history = AggregatePyramid(results_plot_columns)
+        # set when the history should be loaded, once the Results table has
+        # been polled
+        self._plot_history_pending = False
+        self.table_hub.rows_fetched.connect(self.on_rows_fetched)
 
         # Load the UI Page
         # uic.loadUi(appctxt.get_resource("main_window.ui"), baseinstance=self)
@@ -154,7 +174,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.setup_statusbar()
 
         logTextBox = self.logArea
-        guilogger = QTextEditLogger(logTextBox)
+        # messages are queued, and added to the log area in batches
+        guilogger = LogSink(logTextBox)
         logformat = "[%(levelname)1.1s %(asctime)s %(module)s:%(lineno)d %(threadName)s] %(message)s"
         guilogger.setFormatter(logging.Formatter(logformat))
         logging.getLogger().addHandler(guilogger)
@@ -170,14 +191,43 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         # muck around with splitter positions
         self.splitter.setSizes([500, 10])
 
-        self.redraw_timer = QTimer()
-        self.redraw_timer.setInterval(5000)
-        self.redraw_timer.timeout.connect(self.update_displays)
-        self.redraw_timer.start()
+        self.data_update.connect(self.hud.on_data)
+        self.subscribe_plot_data()
+
+        # all periodic updates are run from here, widgets register their own
+        # update tasks with the scheduler
+        self.scheduler.register(
+            "TableHub.poll",
+            self.table_hub.poll,
+            interval=1.0,
+            priority=10,
+            run_immediately=True,
+        )
+        self.scheduler.register(
+            "StatusService.refresh",
+            self.status_service.refresh,
+            interval=1.0,
+            priority=9,
+            run_immediately=True,
+        )
+        self.scheduler.register(
+            "MainWindow.update_displays", self.update_displays, interval=5.0, priority=5
+        )
+        self.scheduler.register(
+            "LogSink.show_pending", guilogger.show_pending, interval=0.5, priority=1
+        )
+        self.scheduler.register(
+            "GuiScheduler.log_stats", self.scheduler.log_stats, interval=600.0
+        )
+        self.scheduler.start()
 
         self.cal_dialog = None
         self.sysinfo_dialog = None
         self.sensitivity_sweep_dialog = None
+        self.log_viewer_dialog = None
+        # time.perf_counter() to report the time to first record from
+        self._first_record_wait = None
+        startup_trace.mark("MainWindow setup")
 
         geom = self.qsettings.value("geometry")
         winstate = self.qsettings.value("windowState")
@@ -190,17 +240,49 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
                 self.restoreState(winstate)
             except Exception as ex:
                 _logger.error(f"Error restoring window state: {ex}")
+        startup_trace.mark("QSettings restore")
 
         # Begin logging if we can find a configuration file
         if self.qsettings.contains("config_fname"):
             config_fname = self.qsettings.value("config_fname")
+            # start acquisition while the countdown is showing, so that
+            # no data are lost after a reboot
+            loader = ControllerLoader(config_fname)
             # allow the user to interrupt startup
             td = TimeoutDialog(timeout=10, config_fname=config_fname, parent=self)
-            if td.exec():
-                self.begin_controlling(config_fname)
+            resume = td.exec()
+            startup_trace.mark("resume logging dialog")
+            if resume:
+                self.begin_controlling(config_fname, loader=loader)
+                startup_trace.mark("begin controlling")
+            else:
+                loader.cancel()
+
+        # this runs once the event loop starts, i.e. after the window is shown
+        QtCore.QTimer.singleShot(0, self.on_startup_finished)
+
+    def on_startup_finished(self):
+        startup_trace.mark("first paint")
+        # create dialog (but don't show it).  This can't wait until the
+        # dialog is opened, because it also re-engages the cal/bg schedule
+        if self.cal_dialog is None:
+            self.create_calibration_dialog()
+            startup_trace.mark("calibration dialog")
+        if self.instrument_controller is None:
+            self.finish_startup_trace()
+        else:
+            # the trace normally finishes once the first plot is drawn, but
+            # there might not be any data to plot
+            QtCore.QTimer.singleShot(60000, self.finish_startup_trace)
+
+    def finish_startup_trace(self):
+        """Log the startup timings, and write them to the 'startup_trace_json'
+        file if that setting exists"""
+        startup_trace.finish(json_path=self.qsettings.value("startup_trace_json"))
 
-        # create dialog (but don't show it)
-        self.create_calibration_dialog()
+    def on_first_plot(self):
+        startup_trace.event("first plot rendered")
+        self.finish_startup_trace()
 
     def setup_statusbar(self):
         sb = self.statusbar
@@ -239,32 +321,6 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if self.instrument_controller is not None:
             self.instrument_controller.maintenance_mode = mm_on
 
-    def show_or_hide_calibration_alert(self):
-        cal_active = False
-        ic = self.instrument_controller
-        if ic is not None:
-            try:
-                ic_status = ic.get_status()
-                if "CalibrationUnitThread" in ic_status:
-                    cal_unit_message = ic_status["CalibrationUnitThread"]["status"][
-                        "message"
-                    ].lower()
-                    cal_active = not (
-                        cal_unit_message == "normal operation"
-                        or cal_unit_message == "no connection"
-                    )
-                else:
-                    # if there is no calibration unit active, then there will be no message about it in the status
-                    # but also 'cal_active' should always be false
-                    cal_active = False
-            except Exception as ex:
-                import traceback
-
-                msg = traceback.format_exc()
-                _logger.error(msg)
-
-        self.alertFrame.setVisible(cal_active)
-
     def set_status(self, message, happy=None):
         if happy is None:
             icon = ""
@@ -299,6 +355,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.actionViewSensitivitySweep.triggered.connect(
             self.view_sensitivity_sweep_dialog
         )
+        self.actionViewLogFile.triggered.connect(self.view_log_file_dialog)
 
     def onLoadConfiguration(self, s):
         # print(f"Load the configuration... {s}")
@@ -320,6 +377,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         # side note: this is quite a nice example of how to generate UI with code
         # using current idioms
         # https://doc.qt.io/qtforpython/tutorials/basictutorial/dialog.html
+        from c_and_b import CAndBForm
+
         w = CAndBForm(mainwindow=self)
         cal_dialog = QtWidgets.QDialog(parent=self)
         cal_dialog.setWindowTitle("Calibration and Background Control")
@@ -342,6 +401,10 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if self.sysinfo_dialog is not None:
             self.sysinfo_dialog.show()
         else:
+            # imported here because it loads the serial port, CR1000 and
+            # LabJack libraries, which slows down startup
+            from system_information import SystemInformationForm
+
             w = SystemInformationForm(mainwindow=self)
             sysinfo_dialog = QtWidgets.QDialog(parent=self)
             sysinfo_dialog.setWindowTitle("System Information")
@@ -354,6 +417,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if self.sensitivity_sweep_dialog is not None:
             self.sensitivity_sweep_dialog.show()
         else:
+            from sensitivity_sweep import SensitivitySweepForm
+
             w = SensitivitySweepForm(mainwindow=self)
             sensitivity_sweep_dialog = QtWidgets.QDialog(parent=self)
             sensitivity_sweep_dialog.setWindowTitle("Sensitivity Sweep")
@@ -362,51 +427,119 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             sensitivity_sweep_dialog.show()
             self.sensitivity_sweep_dialog = sensitivity_sweep_dialog
 
-    def update_plot_data(self, table_name):
-        """Update the local cache of plot data
+    def view_log_file_dialog(self):
+        logfile = None if self.config is None else self.config.logfile
+        if not logfile or not os.path.exists(logfile):
+            QtWidgets.QMessageBox.information(
+                self, "Log File", "There is no log file (check the configuration)."
+            )
+            return
+        if (
+            self.log_viewer_dialog is not None
+            and self.log_viewer_dialog.path == logfile
+        ):
+            # pick up anything logged since the dialog was last shown
+            self.log_viewer_dialog.reload()
+            self.log_viewer_dialog.show()
+            self.log_viewer_dialog.raise_()
+        else:
+            if self.log_viewer_dialog is not None:
+                self.log_viewer_dialog.close()
+                self.log_viewer_dialog.deleteLater()
+            from log_viewer import LogViewerDialog
+
+            self.log_viewer_dialog = LogViewerDialog(logfile, parent=self)
+            self.log_viewer_dialog.show()
+
+    # age of the data kept in the local cache of plot data
+    plot_max_age = {
+        "RTV": datetime.timedelta(days=1),
+        "Results": datetime.timedelta(days=10),
+    }
+    # Results older than the cache are summarised, back to this far
+    plot_history_length = datetime.timedelta(days=365)
+    # ... and loaded this much at a time
+    plot_history_chunk = datetime.timedelta(days=30)
+    # memory (in MB) for the local cache of plot data, shared between the
+    # tables.  Can be overridden by the "plot_memory_budget_mb" setting.
+    default_plot_memory_budget = 32
+
+    def subscribe_plot_data(self):
+        """Keep a local cache of plot data, fed by the TableHub"""
+        for table_name, max_age in self.plot_max_age.items():
+            self.table_hub.subscribe(
+                table_name,
+                functools.partial(self.update_plot_data, table_name),
+                history=max_age,
+            )
+
+    def plot_memory_budget(self) -> float:
+        """Each table's share of the plot data memory budget (bytes)
 
-        Returns:
-         - a flag,  True if the data has changed
-         - the data (in a collections.deque)
+        This applies to the plot buffers and, separately, to the TableHub's
+        cache of the same rows.
         """
+        budget = self.qsettings.value(
+            "plot_memory_budget_mb", self.default_plot_memory_budget
+        )
+        try:
+            budget = float(budget)
+        except (TypeError, ValueError):
+            _logger.warning(f"Ignoring invalid plot_memory_budget_mb: {budget}")
+            budget = self.default_plot_memory_budget
+        return budget * 2**20 / len(self.plot_max_age)
+
+    def plot_buffer_capacity(self, table_name, row) -> int:
+        """Number of rows like 'row' which fit in the table's share of the budget"""
+        nbytes = self.plot_memory_budget()
+        capacity = max(1, int(nbytes // estimate_row_nbytes(row)))
+        _logger.debug(f"Plot buffer for {table_name} has room for {capacity} rows")
+        return capacity
+
+    def check_first_record(self, table_name, rows):
+        """Log the time taken for the first new record to arrive"""
+        t0 = self._first_record_wait
+        # rows from before logging began (i.e. history) don't count
+        t0_wall = time.time() - (time.perf_counter() - t0)
+        if rows[-1]["Datetime"].timestamp() >= t0_wall:
+            dt = time.perf_counter() - t0
+            _logger.info(f"First record ({table_name}) received after {dt:.1f} s")
+            startup_trace.event("first record")
+            self._first_record_wait = None
+
+    def update_plot_data(self, table_name, newdata):
+        """Update the local cache of plot data with new rows from the TableHub"""
         k = table_name
-        default_npoints = {"RTV": 600 * 24, "Results": 24 * 2 * 10}
-        npoints = default_npoints.get(k, 1000)
-        default_max_age = {
-            "RTV": datetime.timedelta(days=1),
-            "Results": datetime.timedelta(days=10),
-        }
-        max_age = default_max_age.get(k, datetime.timedelta(days=1))
+        if self._first_record_wait is not None:
+            self.check_first_record(table_name, newdata)
         if self.plot_data is None:
-            self.plot_data = {"buffer": {}, "t": {}}
-
-        buffer = self.plot_data["buffer"].get(k, collections.deque(maxlen=npoints))
-        told = self.plot_data["t"].get(k, None)
-        if told is None:
-            told = datetime.datetime.now(tz=datetime.timezone.utc) - max_age
-        tnew, newdata = self.instrument_controller.get_rows(table_name, told)
-        # don't consider the time of the update, just the database rowid (see LastRowToken)
-        # which lets us handle multiple detectors & interruptions in data transfer from
-        # one of them
-        if tnew is not None:
-            tnew.t = None
-        data_has_changed = False
-        if not tnew == told:
-            self.plot_data["t"][k] = tnew
-            for row in newdata:
-                buffer.append(row)
-                data_has_changed = True
-                # emit data as a qtSignal
-                # self.data_update.emit(table_name, row)
-            # emit the most recent data from each detector
-            most_recent = {}
-            for row in newdata:
-                most_recent[row["DetectorName"]] = row
-            for row in most_recent.values():
-                self.data_update.emit(table_name, row)
-
-        self.plot_data["buffer"][k] = buffer
-        return data_has_changed, buffer
+            self.plot_data = {"buffer": {}, "changed": {}}
+
+        buffer = self.plot_data["buffer"].get(k)
+        if buffer is None or (
+            len(buffer) > 0 and buffer.column_names != list(newdata[0])
+        ):
+            # columns are written into arrays as the rows arrive, and the
+            # oldest rows are overwritten once the memory budget is used up
+            buffer = ColumnStore(capacity=self.plot_buffer_capacity(k, newdata[0]))
+            self.plot_data["buffer"][k] = buffer
+        buffer.extend(newdata)
+        max_age = self.plot_max_age.get(k)
+        if max_age is not None:
+            buffer.remove_older_than(time.time() - max_age.total_seconds())
+        # keep track of which buffers haven't been plotted yet
+        self.plot_data["changed"][k] = True
+        # emit data as a qtSignal
+        # self.data_update.emit(table_name, row)
+        # emit the most recent data from each detector
+        most_recent = {}
+        for row in newdata:
+            most_recent[row["DetectorName"]] = row
+        for row in most_recent.values():
+            self.data_update.emit(table_name, row)
+
+        if k == "Results":
+            self.update_plots("Results")
 
     def draw_plots(self, data):
         if self.pgwin is not None:
@@ -415,7 +548,11 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self.plotSplitter.addWidget(self.pgwin)
         self.plotSplitter.setSizes([200, 20])
         # the constructor also draws the initial plot
-        self.data_plotter = DataPlotter(self.pgwin, data)
+        with startup_trace.phase("DataPlotter"):
+            self.data_plotter = DataPlotter(self.pgwin, data, history=self.plot_history)
+        if startup_trace.running:
+            # the plot is rendered the next time the event loop runs
+            QtCore.QTimer.singleShot(0, self.on_first_plot)
 
     def update_plots(self, table_name):
         # check that window is visible
@@ -428,12 +565,14 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             # the widget isn't visible, so skip this update
             return
 
-        update_needed, data = self.update_plot_data(table_name)
-        if update_needed:
-            if self.pgwin is None:
-                self.draw_plots(data)
-            else:
-                self.data_plotter.update(data)
+        if self.plot_data is None or not self.plot_data["changed"].get(table_name):
+            return
+        self.plot_data["changed"][table_name] = False
+        data = self.plot_data["buffer"][table_name]
+        if self.pgwin is None:
+            self.draw_plots(data)
+        else:
+            self.data_plotter.update(data)
 
     def close_plots(self):
         if self.pgwin is not None:
@@ -445,8 +584,59 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if self.pgwin is not None:
             self.data_plotter.clear()
         self.plot_data = None
+        self.plot_history.clear()
 
-    def begin_controlling(self, config_fname):
+    def on_rows_fetched(self, table_name):
+        if table_name == "Results" and self._plot_history_pending:
+            # live data comes first, then the history
+            self._plot_history_pending = False
+            self.request_plot_history()
+
+    def request_plot_history(self, newest_age=None):
+        """Summarise older Results, in the background, for the plots
+
+        The history is loaded a chunk at a time, newest first, as low
+        priority requests so that polling carries on in between.
+        """
+        ic = self.instrument_controller
+        if ic is None:
+            return
+        if newest_age is None:
+            newest_age = self.plot_max_age["Results"]
+        if newest_age >= self.plot_history_length:
+            return
+        oldest_age = min(newest_age + self.plot_history_chunk, self.plot_history_length)
+        self.fetch_service.request(
+            ("plot_history", id(ic)),
+            functools.partial(load_plot_history, ic, newest_age, oldest_age),
+            callback=functools.partial(
+                self.on_plot_history, ic, oldest_age, time.perf_counter()
+            ),
+            priority=-1,
+        )
+
+    def on_plot_history(self, ic, oldest_age, t0, history):
+        if ic is not self.instrument_controller:
+            # instrument controller was replaced while the query was running
+            return
+        self.plot_history.merge(history)
+        _logger.debug(
+            f"Loaded plot history for {history.labels}, back to {oldest_age}, "
+            f"in {time.perf_counter() - t0:.1f} s"
+        )
+        if self.plot_data is not None and "Results" in self.plot_data["buffer"]:
+            self.plot_data["changed"]["Results"] = True
+            self.update_plots("Results")
+        self.request_plot_history(oldest_age)
+
+    def begin_controlling(
+        self, config_fname, loader: Optional[ControllerLoader] = None
+    ):
+        """Start logging using a configuration file
+
+        If 'loader' is given, it has already started reading the
+        configuration and initialising the instrument controller.
+        """
 
         # TODO: more of the gui needs to be shutdown/re-configured
         #  * calibration dialog
@@ -464,9 +654,14 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         # data display should be cleared
         self.reset_views()
         self.set_status("Connecting to instrument...", False)
-        _logger.debug(f"Reading configuration from {config_fname}")
+        t_begin = time.perf_counter()
         try:
-            config = config_from_inifile(config_fname)
+            if loader is None:
+                _logger.debug(f"Reading configuration from {config_fname}")
+                with startup_trace.phase("config_from_inifile"):
+                    config = config_from_inifile(config_fname)
+            else:
+                config = loader.get_config()
         except Exception as ex:
             import traceback
 
@@ -478,9 +673,19 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
 
         self.config = config
 
-        setup_logging(config.loglevel, config.logfile)
-
-        self.instrument_controller = initialize(config, mode="thread")
+        if loader is None:
+            setup_logging(config.loglevel, config.logfile)
+            with startup_trace.phase("initialize"):
+                self.instrument_controller = initialize(config, mode="thread")
+        else:
+            self.instrument_controller = loader.get_instrument_controller()
+            # report the time to first record from when the program started
+            if startup_trace.t0 is not None:
+                t_begin = startup_trace.t0
+        self._first_record_wait = t_begin
+        self.table_hub.set_instrument_controller(self.instrument_controller)
+        self.status_service.set_instrument_controller(self.instrument_controller)
+        self._plot_history_pending = True
 
         # sync the gui's Maintenance mode state with the backend
         mm = self.instrument_controller.maintenance_mode
@@ -500,6 +705,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         # TODO: don't shut down IC on Linux
         # print("shutting down instrument controller")
         if self.instrument_controller is not None:
+            # let any running queries finish first
+            self.fetch_service.wait(5000)
             self.instrument_controller.shutdown()
 
         self.qsettings.setValue("geometry", self.saveGeometry())
@@ -513,22 +720,22 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         ic = self.instrument_controller
         if not self.is_logging:
             self.set_status("Disconnected", False)
-            self.hudTextBrowser.setHtml("")
+            self.hud.clear()
             self.clear_plots()
             return
+        # in case the plots were hidden when new data arrived
         self.update_plots("Results")
-        self.update_plot_data("RTV")
-        ic_status = ic.get_status()
-        self.set_status(ic_status["summary"], None)
-        # if the Calibration Unit is active then turn on a banner display
-        self.show_or_hide_calibration_alert()
-        tables = ic.list_data_tables()
-        html = ic.html_current_measurement()
-        self.hudTextBrowser.setHtml(html)
-        num_detectors = len(self.config.detectors)
-        hud_height = num_detectors * 160
-        self.hudTextBrowser.setMinimumHeight(hud_height)
+        # these queries run in the background, displays are updated when the
+        # results arrive
+        self.fetch_service.request(
+            "tables",
+            ic.list_data_tables,
+            callback=functools.partial(self.on_data_tables, ic),
+        )
 
+    def on_data_tables(self, ic, tables):
+        if ic is not self.instrument_controller:
+            return
         if not set(self.configured_tables) == set(tables):
             # build data view UI
             tabwidget = self.tabWidget
@@ -567,6 +774,7 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         tabwidget.addTab(lab, "Waiting for data")
         ## the plots on the right-hand side of main window
         self.clear_plots()
+        self.hud.clear()
 
     @property
     def is_logging(self):
@@ -576,6 +784,8 @@ class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         if self.is_logging:
             self.instrument_controller.shutdown()
             self.instrument_controller = None
+            self.table_hub.set_instrument_controller(None)
+            self.status_service.set_instrument_controller(None)
 
     def start_logging(self):
         if not self.is_logging:
@@ -1,5 +1,9 @@
+import collections
+from typing import Dict, List, Optional
+
 import numpy as np
 import pyqtgraph as pg
+from column_store import ColumnStore, group_indices
 
 _colormap = (
     (158, 202, 225),
@@ -12,28 +16,437 @@ _colormap = (
 _linewidth = 2
 
 
-def data_to_columns(data):
-    """convert data (list of dicts) into dict of arrays"""
-    data_arrays = {}
-    for k in data[0]:
-        data_arrays[k] = np.array([itm[k] for itm in data])
+def store_to_columns(store: ColumnStore):
+    """dict of arrays (views into the store, not copies) for plotting
+
+    Datetime is converted into pyqtgraph's time axis.
+    """
+    data_arrays = {k: store.column(k) for k in store.column_names}
+    data_arrays["Datetime"] = store.time_axis()
     return data_arrays
 
 
-def groupby_series(x, y, legend_data):
-    x = np.array(x)
-    y = np.array(y)
-    if legend_data is None:
-        ret = [(x, y, None)]
-    else:
-        legend_data = np.array(legend_data)
-        ret = []
-        for label in sorted(set(legend_data)):
-            mask = legend_data == label
-            xii = x[mask]
-            yii = y[mask]
-            ret.append((xii, yii, str(label)))
-    return ret
+def groupby_series(x, y, legend_data, groups=None):
+    """Split x and y into one series per label in legend_data
+
+    'groups' can be passed in, if the grouping has already been computed
+    (from `group_indices` or `ColumnStore.groups`), to avoid repeating it
+    for each plot of the same data.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if groups is None:
+        if legend_data is None:
+            return [(x, y, None)]
+        groups = group_indices(legend_data)
+    return [(x[idx], y[idx], str(label)) for label, idx in groups]
+
+
+class SeriesBuffers(object):
+    """The rows of a ColumnStore, split into one series per label
+
+    Each series is a ColumnStore of its own, holding the arrival number
+    of each row ("seq"), the plot time axis ("x") and the y columns as
+    floats, ready to pass to pyqtgraph as views.  `update` only converts
+    the rows which are new since last time and drops rows which have
+    gone from the start of the source store.  The series are only built
+    from scratch if rows are inserted elsewhere in the source store.
+
+    'factory' creates the storage for each series, it needs to provide
+    `extend_columns`, `remove_first`, `column("seq")` and `__len__`, like
+    a ColumnStore (see also StepSeries).
+    """
+
+    def __init__(self, ycols: List[str], huevar="DetectorName", factory=ColumnStore):
+        self.ycols = ycols
+        self.huevar = huevar
+        self.factory = factory
+        self.series: Dict[Optional[str], ColumnStore] = {}
+        self._store = None
+        self._generation = None
+        self._seq_end = 0
+
+    def labels(self) -> List[Optional[str]]:
+        return sorted(self.series, key=lambda x: "" if x is None else x)
+
+    def update(self, store: ColumnStore) -> bool:
+        """Bring the series up to date with 'store'
+
+        Returns True if the series had to be rebuilt from scratch.
+        """
+        rebuilt = False
+        if self._store is not store or self._generation != store._generation:
+            self._store = store
+            self._generation = store._generation
+            self.series = {}
+            self._seq_end = store.first_seq
+            rebuilt = True
+        for label, s in list(self.series.items()):
+            s.remove_first(np.searchsorted(s.column("seq"), store.first_seq))
+            if len(s) == 0:
+                # none of this label's rows are left in the store
+                del self.series[label]
+
+        i0 = max(self._seq_end, store.first_seq) - store.first_seq
+        self._seq_end = store.seq_end
+        nrows = len(store) - i0
+        if nrows <= 0:
+            return rebuilt
+        arrays = {
+            "seq": np.arange(store.seq_end - nrows, store.seq_end),
+            "x": store.time_axis()[i0:],
+        }
+        for k in self.ycols:
+            if k in store.column_names:
+                # conversion into dtype=float converts None values into nan
+                arrays[k] = np.asarray(store.column(k)[i0:], dtype=float)
+            else:
+                arrays[k] = np.full(nrows, np.nan)
+        if self.huevar in store.column_names:
+            groups = group_indices(store.column(self.huevar)[i0:])
+        else:
+            groups = [(None, slice(None))]
+        for label, idx in groups:
+            if label is not None:
+                label = str(label)
+            s = self.series.get(label)
+            if s is None:
+                s = self.factory()
+                self.series[label] = s
+            s.extend_columns({k: v[idx] for k, v in arrays.items()})
+        return rebuilt
+
+
+class CadenceEstimator(object):
+    """Sampling interval of a series, from the median of its recent time steps
+
+    Times are passed to `add` as samples arrive, and only the last
+    'window' steps are kept, so the estimate follows a logger which
+    changes its interval.  The median is cached until more steps arrive.
+    """
+
+    def __init__(self, window=100):
+        self._steps = collections.deque(maxlen=window)
+        self._t_last = None
+        self._interval = None
+        self._stale = False
+
+    def add(self, t):
+        """Add the times (seconds, increasing) of new samples"""
+        if len(t) == 0:
+            return
+        if self._t_last is not None:
+            t = np.r_[self._t_last, t]
+        self._steps.extend(np.diff(t))
+        self._t_last = t[-1]
+        self._stale = True
+
+    @property
+    def interval(self) -> Optional[float]:
+        """Typical time (seconds) between samples, None if not yet known"""
+        if self._stale:
+            self._stale = False
+            steps = np.array(self._steps)
+            # ignore repeated times
+            steps = steps[steps > 0]
+            if len(steps) > 0:
+                self._interval = float(np.median(steps))
+        return self._interval
+
+    def gaps(self, dt, factor=2.5):
+        """True for each time step in 'dt' which is a gap in the data"""
+        interval = self.interval
+        if interval is None:
+            return np.zeros(len(dt), dtype=bool)
+        return dt > interval * factor
+
+
+class StepSeries(object):
+    """One series drawn as steps, with an optional centred running mean
+
+    Each sample is drawn as a bar which ends at its own time and is one
+    sampling interval wide (see CadenceEstimator).  The running mean, over
+    'smooth_time' seconds, is drawn with bars which start at the previous
+    sample.  Windows which contain a NaN, or span a gap in the data, have
+    no mean.  Both are kept in arrays which are extended as samples arrive,
+    and the running mean is computed from running sums, so only the
+    samples near the end of the series are visited on each update.
+
+    This has the same interface as a ColumnStore, for use with
+    SeriesBuffers.
+    """
+
+    def __init__(self, ycol: str, smooth_time: Optional[float] = None):
+        self.ycol = ycol
+        self.smooth_time = smooth_time
+        # number of samples in the running mean, set once the sampling
+        # interval is known
+        self.smooth_width: Optional[int] = None
+        self.cadence = CadenceEstimator()
+        # columns: seq, x, y, and (before each sample) the sum of y, number
+        # of NaNs and number of gaps
+        self._samples = ColumnStore()
+        # two rows per sample, columns: x, y (steps), xs, ys (running mean)
+        self._steps = ColumnStore()
+        self._totals = {"csum": 0.0, "cnan": 0, "cgap": 0}
+        # incremented if steps which have already been drawn are changed
+        # (other than the running mean near the ends of the series)
+        self.generation = 0
+
+    def __len__(self):
+        return len(self._samples)
+
+    def column(self, name):
+        return self._samples.column(name)
+
+    def remove_first(self, nrows):
+        if nrows <= 0:
+            return
+        self._samples.remove_first(nrows)
+        self._steps.remove_first(2 * nrows)
+        if self.smooth_width is not None and len(self._samples) > 0:
+            # the running mean isn't defined near the start of the series
+            nedge = min(self.smooth_width // 2, len(self._samples))
+            self._steps.write_column("ys", 0, np.full(2 * nedge, np.nan))
+
+    def _running_sums(self, values):
+        """Running sums (up to, but not including, each value)"""
+        ret = {}
+        for k, v in values.items():
+            ret[k] = self._totals[k] + np.cumsum(v) - v
+            self._totals[k] += v.sum()
+        return ret
+
+    def extend_columns(self, arrays):
+        x = arrays["x"]
+        y = arrays[self.ycol]
+        nnew = len(x)
+        if nnew == 0:
+            return
+        n0 = len(self._samples)
+        x_prev = self._samples.column("x")[-1] if n0 > 0 else np.nan
+        had_interval = self.cadence.interval is not None
+        self.cadence.add(x)
+        dx = self.cadence.interval
+        if dx is None:
+            dx = np.nan
+        elif not had_interval and n0 > 0:
+            # the earlier samples were drawn before the interval was known
+            self.generation += 1
+            x_old = self._samples.column("x")
+            xplt = np.empty(n0 * 2)
+            xplt[::2] = x_old - dx
+            xplt[1::2] = x_old
+            self._steps.write_column("x", 0, xplt)
+        if np.isnan(x_prev):
+            x_prev = x[0] - dx
+        x_start = np.r_[x_prev, x[:-1]]
+        gaps = self.cadence.gaps(x - x_start)
+        # bars for the running mean normally start at the previous sample,
+        # but not on the far side of a gap
+        x_start[gaps] = x[gaps] - dx
+
+        isnan = np.isnan(y)
+        columns = {"seq": arrays["seq"], "x": x, "y": y}
+        columns.update(
+            self._running_sums(
+                {"csum": np.where(isnan, 0.0, y), "cnan": isnan, "cgap": gaps}
+            )
+        )
+        self._samples.extend_columns(columns)
+        steps = {
+            "x": np.empty(nnew * 2),
+            "y": np.repeat(y, 2),
+            "xs": np.empty(nnew * 2),
+            "ys": np.full(nnew * 2, np.nan),
+        }
+        steps["x"][::2] = x - dx
+        steps["x"][1::2] = x
+        steps["xs"][::2] = x_start
+        steps["xs"][1::2] = x
+        self._steps.extend_columns(steps)
+
+        if self.smooth_time is not None:
+            if self.smooth_width is None and self.cadence.interval is not None:
+                self.smooth_width = int(round(self.smooth_time / self.cadence.interval))
+                n0 = 0
+            if self.smooth_width is not None:
+                self._update_mean(n0)
+
+    def _update_mean(self, n0):
+        """Compute the running mean for samples which now have a full window"""
+        half = self.smooth_width // 2
+        n = len(self._samples)
+        # the mean is known up to n0-half already
+        i0 = max(half, n0 - half)
+        i1 = n - half
+        if i1 <= i0:
+            return
+        # running sums from the start of the first window, and past the end
+        first = i0 - half
+        sums = {
+            k: np.r_[self._samples.column(k)[first:], total]
+            for k, total in self._totals.items()
+        }
+        lo = np.arange(i0, i1) - half - first
+        hi = lo + 2 * half + 1
+        mean = (sums["csum"][hi] - sums["csum"][lo]) / (2 * half + 1)
+        # a NaN anywhere in the window gives NaN, as with np.convolve
+        mean[sums["cnan"][hi] - sums["cnan"][lo] > 0] = np.nan
+        # as does a gap between any of the samples in the window
+        mean[sums["cgap"][hi] - sums["cgap"][lo + 1] > 0] = np.nan
+        self._steps.write_column("ys", 2 * i0, np.repeat(mean, 2))
+
+    def step_data(self):
+        """x, y (views) for drawing the series as steps"""
+        return self._steps.column("x"), self._steps.column("y")
+
+    def smoothed_step_data(self):
+        """x, y (views) for drawing the running mean as steps
+
+        Empty unless there's enough data for the mean to be useful.
+        """
+        if self.smooth_width is None or len(self) <= self.smooth_width * 3:
+            return np.empty(0), np.empty(0)
+        return self._steps.column("xs"), self._steps.column("ys")
+
+
+class MinMaxDecimator(object):
+    """Reduce a series to its minimum and maximum in each bucket of x
+
+    Buckets are 'width' wide and aligned to multiples of the width, so
+    after rows are appended only the last bucket (and any new ones) need
+    to be computed again, and after rows are dropped from the start only
+    the first bucket does.  'margin' (in units of x) widens the region
+    which is recomputed at each end, for series where values near the
+    ends can change in place (e.g. a running mean).  Call `reset` if the
+    series changes in any other way.
+    """
+
+    def __init__(self, margin=0.0):
+        self.margin = margin
+        self.width = None
+        self._out: Optional[ColumnStore] = None
+
+    def reset(self):
+        self._out = None
+
+    def _buckets(self, x, y):
+        """Two points (min, then max) for each bucket"""
+        b = np.floor(x / self.width)
+        starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+        ends = np.r_[starts[1:], len(x)]
+        out = {
+            "x": np.empty(len(starts) * 2),
+            "y": np.empty(len(starts) * 2),
+            "b": np.repeat(b[starts], 2),
+        }
+        out["x"][::2] = x[starts]
+        out["x"][1::2] = x[ends - 1]
+        # fmin/fmax ignore NaNs, unless the whole bucket is NaN
+        out["y"][::2] = np.fmin.reduceat(y, starts)
+        out["y"][1::2] = np.fmax.reduceat(y, starts)
+        return out
+
+    def _rebuild(self, x, y):
+        self._out = ColumnStore()
+        self._out.extend_columns(self._buckets(x, y))
+
+    def decimate(self, x, y, width):
+        """The decimated series, x and y (views, don't modify them)"""
+        if len(x) == 0:
+            return x, y
+        y = np.asarray(y, dtype=float)
+        if width != self.width or self._out is None:
+            self.width = width
+            self._rebuild(x, y)
+        else:
+            self._update(x, y)
+        return self._out.column("x"), self._out.column("y")
+
+    def _update(self, x, y):
+        out = self._out
+        width = self.width
+        # rows dropped from the start
+        b_first = np.floor(x[0] / width)
+        out.remove_first(np.searchsorted(out.column("b"), b_first))
+        b_front = np.floor((x[0] + self.margin) / width)
+        nfront = np.searchsorted(out.column("b"), b_front, side="right")
+        ifront = np.searchsorted(x, (b_front + 1) * width)
+        front = self._buckets(x[:ifront], y[:ifront])
+        if nfront == 0 or len(front["x"]) != nfront:
+            self._rebuild(x, y)
+            return
+        for k, v in front.items():
+            out.write_column(k, 0, v)
+        # rows added (or changed) at the end
+        b_tail = min(out.column("b")[-1], np.floor((x[-1] - self.margin) / width))
+        out.remove_last(len(out) - np.searchsorted(out.column("b"), b_tail))
+        itail = np.searchsorted(x, b_tail * width)
+        out.extend_columns(self._buckets(x[itail:], y[itail:]))
+
+
+class DecimatedCurve(object):
+    """A curve on a PlotItem, drawn from about two points per pixel
+
+    The data are reduced with a MinMaxDecimator, so peaks are kept, and
+    the decimation is redone when the view is zoomed or resized.  Short
+    series are drawn as-is.
+    """
+
+    def __init__(self, plot_item: pg.PlotItem, margin=0.0, **kwargs):
+        self.plot_item = plot_item
+        self.curve = plot_item.plot(**kwargs)
+        self.decimator = MinMaxDecimator(margin)
+        self._x = np.empty(0)
+        self._y = np.empty(0)
+        self._width = None
+        vb = plot_item.getViewBox()
+        vb.sigXRangeChanged.connect(self._on_view_changed)
+        vb.sigResized.connect(self._on_view_changed)
+
+    def setData(self, x, y, rebuilt=False):
+        """Draw x, y, which are the previous data with rows appended (or
+        dropped from the start) unless 'rebuilt' is True"""
+        if rebuilt:
+            self.decimator.reset()
+        self._x = x
+        self._y = y
+        self._redraw()
+
+    def setZValue(self, z):
+        self.curve.setZValue(z)
+
+    def remove(self):
+        vb = self.plot_item.getViewBox()
+        vb.sigXRangeChanged.disconnect(self._on_view_changed)
+        vb.sigResized.disconnect(self._on_view_changed)
+        self.plot_item.removeItem(self.curve)
+
+    def _bucket_width(self):
+        vb = self.plot_item.getViewBox()
+        x0, x1 = vb.viewRange()[0]
+        pixels = vb.width()
+        if pixels < 1 or not x1 > x0:
+            return None
+        # round up to a power of two, so that panning (and small changes in
+        # zoom) don't change the buckets
+        return 2.0 ** np.ceil(np.log2((x1 - x0) / pixels))
+
+    def _on_view_changed(self, *args):
+        if self._bucket_width() != self._width:
+            self._redraw()
+
+    def _redraw(self):
+        x, y = self._x, self._y
+        width = self._bucket_width()
+        self._width = width
+        if width is None or len(x) < 2 or len(x) <= 2 * (x[-1] - x[0]) / width:
+            # no more than two points per pixel already
+            self.decimator.reset()
+        else:
+            x, y = self.decimator.decimate(x, y, width)
+        self.curve.setData(x, y)
 
 
 def get_pen(idx):
@@ -5,12 +5,17 @@ import time
 
 import numpy as np
 import pyqtgraph as pg
-from plotutils import data_to_columns, get_pen, groupby_series
+from column_store import ColumnStore
+from plotutils import (CadenceEstimator, get_pen, groupby_series,
+                       store_to_columns)
 from PyQt5 import QtCore, QtWidgets
 from ui_sensitivity_sweep import Ui_SensitivitySweepForm
 
 
 class SensitivitySweepForm(QtWidgets.QWidget, Ui_SensitivitySweepForm):
+    # sampling interval (seconds) to assume until it has been measured
+    default_sample_interval = 10.0
+
     def __init__(self, mainwindow, *args, **kwargs):
         super(SensitivitySweepForm, self).__init__(*args, **kwargs)
         self.setupUi(self)
@@ -31,6 +36,8 @@ class SensitivitySweepForm(QtWidgets.QWidget, Ui_SensitivitySweepForm):
         self._all_detectors = [itm.name for itm in mainwindow.config.detectors]
         self.comboBox.addItems(self._all_detectors)
         self._detector_name = self._all_detectors[0]
+        # sampling interval of the selected detector's RTV data
+        self._cadence = CadenceEstimator()
 
         self.connect_signals(mainwindow)
 
@@ -56,12 +63,12 @@ class SensitivitySweepForm(QtWidgets.QWidget, Ui_SensitivitySweepForm):
         self.v1 = self.hvHighSpinBox.value()
         self.vstep = self.hvStepSpinBox.value()
         self.sec = self.hvSecSpinBox.value()
-        self.npoints = int(self.sec / 10)
+        self.npoints = max(1, int(self.sec / self.sample_interval()))
         self.v = self.v0
 
         self._samples_at_voltage = {self.v: 0}
-        self.timeseries_data = []
-        self.sweep_data = []
+        self.timeseries_data = ColumnStore()
+        self.sweep_data = ColumnStore()
 
         self.hvTargetLabel.setText(f"{self.v0} V")
         self.hvMeasuredLabel.setText("--- V")
@@ -75,29 +82,39 @@ class SensitivitySweepForm(QtWidgets.QWidget, Ui_SensitivitySweepForm):
 
     def onDetectorChanged(self):
         self._detector_name = self.comboBox.currentText()
+        self._cadence = CadenceEstimator()
+
+    def sample_interval(self):
+        """Sampling interval (seconds) of the selected detector"""
+        interval = self._cadence.interval
+        if interval is None:
+            interval = self.default_sample_interval
+        return interval
 
     def onData(self, table_name, row):
-        if not self._sweep_is_running:
-            return
         if not table_name == "RTV":
             return
         if not row["DetectorName"] == self._detector_name:
             return
+        # keep track of the sampling interval, even between sweeps
+        self._cadence.add([row["Datetime"].timestamp()])
+        if not self._sweep_is_running:
+            return
         row = copy.deepcopy(row)
-        row["HV_nominal"] = np.NaN
+        row["HV_nominal"] = np.nan
         noiseOk = True
         if self.noiseCheckBox.isEnabled():
             # Check that there isn't any noise on this measurement
             try:
                 # on the RTV table, ULD is just called "ULD" (not ULD_Tot)
                 if row["ULD"] > 0:
-                    noiseOk=False
+                    noiseOk = False
             except:
                 # TODO: log this error somehow?
-                noiseOk=True
+                noiseOk = True
 
         if noiseOk:
-            self.timeseries_data.append(row)
+            self.timeseries_data.extend([row])
 
         target = self.v
         self.hvTargetLabel.setText(f"{target} V")
@@ -125,12 +142,12 @@ class SensitivitySweepForm(QtWidgets.QWidget, Ui_SensitivitySweepForm):
                 "Set PMT voltage (HV supply) to target value..."
             )
         elif noiseOk:
-            row["HV_nominal"] = target
+            row["HV_nominal"] = float(target)
             n = self._samples_at_voltage[target]
             n += 1
             self._samples_at_voltage[target] = n
             self.progressBar.setValue(float(100.0 * n / self.npoints))
-            self.sweep_data.append(row)
+            self.sweep_data.extend([row])
             self.instructionLabel.setText("")
             self.update_plot()
 
@@ -152,8 +169,8 @@ class SensitivitySweepForm(QtWidgets.QWidget, Ui_SensitivitySweepForm):
         while len(self._s1) > 0:
             s = self._s1.pop()
             self._p1.removeItem(s)
-        datac = data_to_columns(self.timeseries_data)
-        x = np.array([itm.timestamp() + time.timezone for itm in datac["Datetime"]])
+        datac = store_to_columns(self.timeseries_data)
+        x = datac["Datetime"]
         idx = 0
         for k in datac.keys():
             if k.startswith("HV") and not k.endswith("nominal"):
@@ -166,22 +183,24 @@ class SensitivitySweepForm(QtWidgets.QWidget, Ui_SensitivitySweepForm):
             s = self._s2.pop()
             self._p2.removeItem(s)
 
-        hv_groups = list(set([itm["HV_nominal"] for itm in self.sweep_data]))
         hv_names = [
             itm
-            for itm in self.sweep_data[0].keys()
+            for itm in self.sweep_data.column_names
             if itm.startswith("HV") and not itm.endswith("nominal")
         ]
-        datac = data_to_columns(self.sweep_data)
+        datac = store_to_columns(self.sweep_data)
+        interval = self.sample_interval()
+        # the grouping is the same for each HV column
+        nominal_groups = self.sweep_data.groups("HV_nominal")
         for ii, hv_name in enumerate(hv_names):
             lld_name = hv_name.replace("HV", "LLD")
             pen = get_pen(ii)
             x = datac[hv_name]
-            y = datac[lld_name] / 10.0
+            y = datac[lld_name] / interval
             self._s2.append(self._p2.plot(x=x, y=y, pen=None, symbol="x", name=k))
             # sum up counts and average HV
             grouped_data = groupby_series(
-                datac[hv_name], datac[lld_name], datac["HV_nominal"]
+                datac[hv_name], datac[lld_name], datac["HV_nominal"], nominal_groups
             )
             xplt = []
             yplt = []
@@ -189,7 +208,7 @@ class SensitivitySweepForm(QtWidgets.QWidget, Ui_SensitivitySweepForm):
             for xii, yii, labelii in grouped_data:
                 x = xii.mean()
                 n = len(xii)
-                y = yii.mean() / 10.0  # counts per second
+                y = yii.mean() / interval  # counts per second
                 sigma = np.sqrt(yii.sum()) / yii.sum() * y
                 xplt.append(x)
                 yplt.append(y)
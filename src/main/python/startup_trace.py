@@ -0,0 +1,121 @@
+import contextlib
+import datetime
+import json
+import logging
+import platform
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+_logger = logging.getLogger(__name__)
+
+
+class StartupTrace(object):
+    """Time stamps for the phases of startup, from main.py to the first plot
+
+    Phases on the GUI thread follow one another, so `mark` records a phase
+    as ending now and starting where the last one ended.  Phases which run
+    elsewhere (e.g. the instrument controller starting in a background
+    thread) use the `phase` context manager, and one-off moments (e.g. the
+    first rows from the database) are recorded with `event`.  Times are
+    seconds from `start`.  Once `finish` has been called, nothing more is
+    recorded.
+    """
+
+    def __init__(self):
+        self.t0: Optional[float] = None
+        # wall-clock time at t0
+        self.started: Optional[datetime.datetime] = None
+        self.phases: List[Dict] = []
+        self.events: Dict[str, float] = {}
+        self.finished = False
+        self._last_mark: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self, t: Optional[float] = None):
+        """Start the clock (t is a time.perf_counter() value, default now)"""
+        now = time.perf_counter()
+        self.t0 = now if t is None else t
+        self.started = datetime.datetime.now() - datetime.timedelta(
+            seconds=now - self.t0
+        )
+        self._last_mark = self.t0
+
+    @property
+    def running(self):
+        return self.t0 is not None and not self.finished
+
+    def _add_phase(self, name, t_start, t_end):
+        with self._lock:
+            self.phases.append(
+                {
+                    "name": name,
+                    "start_s": round(t_start - self.t0, 4),
+                    "duration_s": round(t_end - t_start, 4),
+                    "thread": threading.current_thread().name,
+                }
+            )
+
+    def mark(self, name):
+        """Record a phase (on the GUI thread) which ended now"""
+        if not self.running:
+            return
+        now = time.perf_counter()
+        self._add_phase(name, self._last_mark, now)
+        self._last_mark = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Record the time taken by the code in a 'with' block"""
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.running:
+                self._add_phase(name, t_start, time.perf_counter())
+
+    def event(self, name):
+        """Record the first time something happened"""
+        if not self.running:
+            return
+        with self._lock:
+            self.events.setdefault(name, round(time.perf_counter() - self.t0, 4))
+
+    def summary(self) -> Dict:
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "total_s": round(time.perf_counter() - self.t0, 4),
+            "phases": list(self.phases),
+            "events": dict(self.events),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "machine": platform.node(),
+        }
+
+    def finish(self, json_path: Optional[str] = None):
+        """Log the summary and, optionally, append it to a JSON-lines file"""
+        if not self.running:
+            return
+        summary = self.summary()
+        self.finished = True
+        lines = [
+            f"{itm['start_s']:7.2f} s  {itm['duration_s']:6.2f} s  {itm['name']}"
+            + ("" if itm["thread"] == "MainThread" else f" [{itm['thread']}]")
+            for itm in summary["phases"]
+        ]
+        lines += [f"{t:7.2f} s  {name}" for name, t in summary["events"].items()]
+        _logger.info(
+            f"Startup took {summary['total_s']:.2f} s (start, duration, phase):\n  "
+            + "\n  ".join(lines)
+        )
+        if json_path:
+            try:
+                with open(json_path, "a") as f:
+                    f.write(json.dumps(summary) + "\n")
+            except OSError as ex:
+                _logger.warning(f"Unable to write startup trace to {json_path}: {ex}")
+
+
+# the trace for this run of the program
+trace = StartupTrace()
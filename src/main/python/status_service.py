@@ -0,0 +1,143 @@
+import functools
+import logging
+import time
+import traceback
+from typing import NamedTuple, Optional
+
+from PyQt5 import QtCore
+
+_logger = logging.getLogger(__name__)
+
+
+class StatusSnapshot(NamedTuple):
+    """The state of the instrument controller at one moment"""
+
+    # one-line summary, for the status bar
+    summary: str
+    # True if the calibration unit is doing something (e.g. injecting)
+    cal_unit_active: bool
+    cal_running: bool
+    bg_running: bool
+    cal_and_bg_scheduled: bool
+    # everything returned by ic.get_status()
+    status: dict
+    # time.monotonic() when the snapshot was taken
+    time: float
+
+
+def calibration_unit_active(ic_status) -> bool:
+    """True if the status says the calibration unit is doing something"""
+    if "CalibrationUnitThread" not in ic_status:
+        # if there is no calibration unit active, then there will be no
+        # message about it in the status
+        return False
+    try:
+        cal_unit_message = ic_status["CalibrationUnitThread"]["status"][
+            "message"
+        ].lower()
+    except Exception:
+        _logger.error(traceback.format_exc())
+        return False
+    return not (
+        cal_unit_message == "normal operation" or cal_unit_message == "no connection"
+    )
+
+
+def read_status(ic) -> StatusSnapshot:
+    """Query the instrument controller (this is slow, so it runs in the background)"""
+    ic_status = ic.get_status()
+    return StatusSnapshot(
+        summary=ic_status["summary"],
+        cal_unit_active=calibration_unit_active(ic_status),
+        cal_running=bool(ic.cal_running),
+        bg_running=bool(ic.bg_running),
+        cal_and_bg_scheduled=bool(ic.cal_and_bg_is_scheduled()),
+        status=ic_status,
+        time=time.monotonic(),
+    )
+
+
+def _cal_bg_state(snapshot: StatusSnapshot):
+    return (snapshot.cal_running, snapshot.bg_running, snapshot.cal_and_bg_scheduled)
+
+
+class StatusService(QtCore.QObject):
+    """A cached snapshot of the instrument controller status
+
+    The status is fetched in the background (at most once per 'ttl'
+    seconds, however many times `refresh` is called) and widgets are told
+    about the parts which changed, via signals, instead of each one
+    querying the instrument controller.  After a new instrument controller
+    is set, the first snapshot emits every signal.
+    """
+
+    # every new snapshot
+    updated = QtCore.pyqtSignal(object)
+    # StatusSnapshot.summary
+    summary_changed = QtCore.pyqtSignal(str)
+    # StatusSnapshot.cal_unit_active
+    cal_unit_active_changed = QtCore.pyqtSignal(bool)
+    # cal_running, bg_running or cal_and_bg_scheduled changed.  The argument
+    # is the StatusSnapshot, or None if there is no instrument controller
+    cal_bg_changed = QtCore.pyqtSignal(object)
+
+    def __init__(self, fetch_service, ttl=1.0, parent=None):
+        super(StatusService, self).__init__(parent)
+        self._fetch_service = fetch_service
+        self.ttl = ttl
+        self._ic = None
+        self._snapshot: Optional[StatusSnapshot] = None
+        # incremented by `invalidate`, so that queries which were already
+        # running can be ignored
+        self._epoch = 0
+
+    @property
+    def snapshot(self) -> Optional[StatusSnapshot]:
+        """The most recent status, or None if there isn't one yet"""
+        return self._snapshot
+
+    def set_instrument_controller(self, ic):
+        """Start again with a new (or no) instrument controller"""
+        self._ic = ic
+        self._snapshot = None
+        if ic is None:
+            self.cal_bg_changed.emit(None)
+
+    def invalidate(self):
+        """Make the next `refresh` fetch the status (e.g. after a command)
+
+        The result of a query which is already running is discarded, because
+        it might be from before the command.
+        """
+        self._epoch += 1
+        if self._snapshot is not None:
+            self._snapshot = self._snapshot._replace(time=-float("inf"))
+
+    def refresh(self):
+        """Fetch the status, unless the snapshot is still fresh"""
+        ic = self._ic
+        if ic is None:
+            return
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.time < self.ttl:
+            return
+        self._fetch_service.request(
+            "status",
+            functools.partial(read_status, ic),
+            callback=functools.partial(self._on_status, ic, self._epoch),
+        )
+
+    def _on_status(self, ic, epoch, snapshot: StatusSnapshot):
+        if ic is not self._ic or epoch != self._epoch:
+            # instrument controller was replaced, or the status was
+            # invalidated, while the query was running
+            return
+        old = self._snapshot
+        self._snapshot = snapshot
+        self.updated.emit(snapshot)
+        if old is None or old.summary != snapshot.summary:
+            self.summary_changed.emit(snapshot.summary)
+        if old is None or old.cal_unit_active != snapshot.cal_unit_active:
+            self.cal_unit_active_changed.emit(snapshot.cal_unit_active)
+        if old is None or _cal_bg_state(old) != _cal_bg_state(snapshot):
+            self.cal_bg_changed.emit(snapshot)
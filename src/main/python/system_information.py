@@ -89,11 +89,12 @@ class SystemInformationForm(QtWidgets.QWidget, Ui_SystemInformationForm):
         self.mainwindow = mainwindow
         self.connect_signals()
 
-        t = QtCore.QTimer()
-        t.setInterval(1000)
-        t.timeout.connect(self.enumerate_serial_ports)
-        t.start()
-        self.serial_port_watcher_timer = t
+        mainwindow.scheduler.register(
+            "SystemInformationForm.enumerate_serial_ports",
+            self.enumerate_serial_ports,
+            interval=1.0,
+            widget=self,
+        )
         self.detected_serial_ports = []
         self.cr1000 = None
 
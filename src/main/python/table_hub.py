@@ -0,0 +1,275 @@
+import datetime
+import functools
+import inspect
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from column_store import ColumnStore, estimate_row_nbytes
+from PyQt5 import QtCore
+from startup_trace import trace as startup_trace
+
+_logger = logging.getLogger(__name__)
+
+
+def accepts_end_time(ic) -> bool:
+    """True if an instrument controller's get_rows has an end_time argument
+
+    Otherwise, a query returns every row from start_time up to now.
+    """
+    try:
+        return "end_time" in inspect.signature(ic.get_rows).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+class Subscription(object):
+    """Handle returned by TableHub.subscribe"""
+
+    def __init__(self, hub: "TableHub", table_name: str, callback, history):
+        self.hub = hub
+        self.table_name = table_name
+        self.callback = callback
+        self.history = history
+        # sequence number of the next row this subscriber needs
+        self.seq = 0
+        self.paused = False
+        # set while waiting for the catch-up after `resume`
+        self.catching_up = False
+        self.on_caught_up: Optional[Callable[[int, float], None]] = None
+        self._resume_time = 0.0
+
+    def unsubscribe(self):
+        self.hub._unsubscribe(self)
+
+    def pause(self):
+        """Stop delivering rows (e.g. while the subscriber is hidden)
+
+        If every subscriber to a table is paused, the table is not polled.
+        """
+        self.paused = True
+        self.catching_up = False
+
+    def resume(self, on_caught_up: Optional[Callable[[int, float], None]] = None):
+        """Start delivering rows again
+
+        Everything which arrived while paused, plus anything new in the
+        database, is passed to the callback as a single batch once the
+        table has been re-fetched.  After that, on_caught_up(nrows, seconds)
+        is called with the size of the batch and the time taken.
+        """
+        if not self.paused:
+            return
+        self.paused = False
+        self.catching_up = True
+        self.on_caught_up = on_caught_up
+        self._resume_time = time.perf_counter()
+        self.hub._fetch(self.table_name)
+
+
+class _TableCache(object):
+    """New rows, and recent history, for one table"""
+
+    def __init__(self):
+        self.subscriptions: List[Subscription] = []
+        # reference to the last row received (a LastRowToken from get_rows)
+        self.token = None
+        # cached rows, stored column-wise
+        self.rows = ColumnStore()
+        # approximate memory used by each cached row
+        self.row_nbytes = 0
+        # rows are numbered in order of arrival, these are the sequence
+        # numbers of the first cached row and of the next row to arrive
+        self.seq_start = 0
+        self.seq_end = 0
+        # time.monotonic() of the last fetch
+        self.last_fetch_time: Optional[float] = None
+
+    def clear(self):
+        self.token = None
+        self.rows.clear()
+        self.seq_start = self.seq_end
+        self.last_fetch_time = None
+
+    def add(self, rows: List):
+        if len(self.rows) > 0 and self.rows.column_names != list(rows[0]):
+            # the columns have changed, so the cache can't hold both
+            _logger.debug("Columns have changed, discarding cached rows")
+            self.rows.clear()
+            self.seq_start = self.seq_end
+        if len(self.rows) == 0:
+            self.row_nbytes = estimate_row_nbytes(rows[0], fixed_capacity=False)
+        self.rows.extend(rows)
+        self.seq_end += len(rows)
+
+    def _remove_first(self, nrows: int):
+        nrows = min(nrows, len(self.rows))
+        self.rows.remove_first(nrows)
+        self.seq_start += nrows
+
+    def trim(self, retention: datetime.timedelta, max_bytes: Optional[float] = None):
+        """drop rows older than 'retention', and the oldest rows beyond 'max_bytes'"""
+        cutoff = time.time() - retention.total_seconds()
+        nrows = self.rows.remove_older_than(cutoff)
+        self.seq_start += nrows
+        if max_bytes is not None and len(self.rows) > 0:
+            max_rows = max(1, int(max_bytes // self.row_nbytes))
+            self._remove_first(len(self.rows) - max_rows)
+
+    def rows_since(self, seq: int) -> List:
+        """Cached rows from sequence number 'seq' onwards"""
+        start = max(seq, self.seq_start) - self.seq_start
+        return self.rows.to_rows(slice(start, None))
+
+    @property
+    def active(self) -> bool:
+        """True if any of the subscribers want new rows"""
+        return any(not itm.paused for itm in self.subscriptions)
+
+
+class TableHub(QtCore.QObject):
+    """A shared, per-table cache of data from the instrument controller
+
+    Widgets which display a table subscribe to it here, instead of polling
+    the database themselves.  Once per cycle (each call to `poll`) the new
+    rows from each subscribed table are fetched, in the background, and
+    the batch is passed to every subscriber.  Recent rows are kept so that
+    a new subscriber can be given its history without another query.
+
+    Subscribers can be paused (e.g. a data tab which isn't visible).  Tables
+    with no active subscribers aren't polled, and a resumed subscriber
+    catches up with everything it missed in one batch.  `rows_fetched` is
+    emitted after each query, even if there were no new rows.
+
+    The cached rows are stored column-wise and, if 'max_bytes' is set, each
+    table's cache is limited to (approximately) that much memory.
+    """
+
+    # table name, emitted after each get_rows query has been handled
+    rows_fetched = QtCore.pyqtSignal(str)
+
+    def __init__(self, fetch_service, parent=None, max_bytes=None):
+        super(TableHub, self).__init__(parent)
+        self._fetch_service = fetch_service
+        # memory limit (bytes) for each table's cache, or None
+        self.max_bytes: Optional[float] = max_bytes
+        self._ic = None
+        self._tables: Dict[str, _TableCache] = {}
+
+    def set_instrument_controller(self, ic):
+        """Start again with a new (or no) instrument controller"""
+        self._ic = ic
+        for table in self._tables.values():
+            table.clear()
+
+    def subscribe(
+        self,
+        table_name: str,
+        callback: Callable[[List], None],
+        history: datetime.timedelta = datetime.timedelta(days=1),
+        paused: bool = False,
+    ) -> Subscription:
+        """Call callback(rows) with each batch of new rows from table_name
+
+        Any rows already cached from the last 'history' are passed to the
+        callback straight away.  If 'paused' is True, nothing is fetched
+        for this subscriber until `Subscription.resume` is called.
+        """
+        table = self._tables.setdefault(table_name, _TableCache())
+        sub = Subscription(self, table_name, callback, history)
+        sub.paused = paused
+        sub.seq = table.seq_end
+        table.subscriptions.append(sub)
+        if len(table.rows) > 0:
+            cutoff = time.time() - history.total_seconds()
+            backfill = table.rows.to_rows(
+                np.flatnonzero(table.rows.sort_key() >= cutoff)
+            )
+            if len(backfill) > 0:
+                callback(backfill)
+        return sub
+
+    def _unsubscribe(self, sub: Subscription):
+        table = self._tables.get(sub.table_name)
+        if table is not None and sub in table.subscriptions:
+            table.subscriptions.remove(sub)
+
+    def _retention(self, table: _TableCache) -> datetime.timedelta:
+        return max(itm.history for itm in table.subscriptions)
+
+    def poll(self):
+        """Fetch new rows for each table which has active subscribers"""
+        for table_name, table in self._tables.items():
+            if table.active:
+                self._fetch(table_name)
+
+    def _fetch(self, table_name):
+        ic = self._ic
+        if ic is None:
+            return
+        table = self._tables[table_name]
+        retention = self._retention(table)
+        if (
+            table.last_fetch_time is not None
+            and time.monotonic() - table.last_fetch_time > retention.total_seconds()
+        ):
+            # nobody has been watching this table for longer than we keep
+            # data, so don't ask for everything since the last fetch
+            _logger.debug(f"{table_name} has been idle, discarding cached rows")
+            table.clear()
+        if table.token is None:
+            start_time = datetime.datetime.now(datetime.timezone.utc) - retention
+        else:
+            start_time = table.token
+        table.last_fetch_time = time.monotonic()
+        self._fetch_service.request(
+            ("TableHub", table_name),
+            functools.partial(ic.get_rows, table_name, start_time=start_time),
+            callback=functools.partial(self._on_rows, ic, table_name),
+        )
+
+    def _on_rows(self, ic, table_name, result):
+        if ic is not self._ic:
+            # instrument controller was replaced while the query was running
+            return
+        t, rows = result
+        startup_trace.event(f"first get_rows ({table_name})")
+        if t is None:
+            self.rows_fetched.emit(table_name)
+            return
+        # use the database rowid as the reference, rather than taking the
+        # time into account (this handles multipe detectors where one might
+        # stop updating for a while)
+        t.t = None
+        table = self._tables[table_name]
+        table.token = t
+        if len(rows) > 0:
+            table.add(rows)
+        if len(table.subscriptions) > 0:
+            table.trim(self._retention(table), self.max_bytes)
+        # copy the list, in case a callback unsubscribes
+        for sub in list(table.subscriptions):
+            if sub.paused:
+                continue
+            if sub.seq == table.seq_end - len(rows):
+                batch = rows
+            else:
+                # this subscriber has been paused, and needs to catch up
+                batch = table.rows_since(sub.seq)
+            sub.seq = table.seq_end
+            try:
+                if len(batch) > 0:
+                    sub.callback(batch)
+                if sub.catching_up:
+                    sub.catching_up = False
+                    if sub.on_caught_up is not None:
+                        dt = time.perf_counter() - sub._resume_time
+                        sub.on_caught_up(len(batch), dt)
+            except Exception:
+                import traceback
+
+                _logger.error(
+                    f"Error passing {table_name} data to subscriber: {traceback.format_exc()}"
+                )
+        self.rows_fetched.emit(table_name)
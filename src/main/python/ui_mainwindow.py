@@ -140,6 +140,8 @@ class Ui_MainWindow(object):
         self.actionDarkMode.setObjectName("actionDarkMode")
         self.actionViewSensitivitySweep = QtWidgets.QAction(MainWindow)
         self.actionViewSensitivitySweep.setObjectName("actionViewSensitivitySweep")
+        self.actionViewLogFile = QtWidgets.QAction(MainWindow)
+        self.actionViewLogFile.setObjectName("actionViewLogFile")
         self.actionMaintence_Mode = QtWidgets.QAction(MainWindow)
         self.actionMaintence_Mode.setCheckable(True)
         self.actionMaintence_Mode.setObjectName("actionMaintence_Mode")
@@ -155,6 +157,7 @@ class Ui_MainWindow(object):
         self.menuView.addAction(self.actionViewCalibration)
         self.menuView.addAction(self.actionViewSystemInformation)
         self.menuView.addAction(self.actionViewSensitivitySweep)
+        self.menuView.addAction(self.actionViewLogFile)
         self.menuView.addSeparator()
         self.menuView.addAction(self.actionDarkMode)
         self.menubar.addAction(self.menuFile.menuAction())
@@ -187,6 +190,7 @@ class Ui_MainWindow(object):
         self.actionViewSystemInformation.setText(_translate("MainWindow", "System Information"))
         self.actionDarkMode.setText(_translate("MainWindow", "Dark Mode"))
         self.actionViewSensitivitySweep.setText(_translate("MainWindow", "Sensitivity Sweep"))
+        self.actionViewLogFile.setText(_translate("MainWindow", "Log File"))
         self.actionMaintence_Mode.setText(_translate("MainWindow", "Maintence Mode"))
         self.actionSync_Output.setText(_translate("MainWindow", "Sync Output Files"))
 